@@ -0,0 +1,376 @@
+import argparse
+import contextlib
+import gzip
+import hashlib
+import importlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_compare import compare
+from sql_dump import iter_statements
+
+# Equivalence and throughput benchmark for the dump cleaners. Synthetic
+# dumps are assembled from fragments whose fate under each rule set is
+# known up front: statements taken from a real schema dump (kept), owner
+# blocks in both pg_dump layouts and orphaned OWNER TO lines (dropped by
+# drop-owner), ALTER TABLE headers left hanging before a new command
+# (dropped by drop-hanging-alter), SET lines (dropped by drop-set), and
+# traps that every cleaner must keep: COPY data, $$ function bodies, string
+# literals and comments holding lines that look like SET / OWNER TO /
+# hanging ALTER TABLE, quoted identifiers named like them, and multi-line
+# ALTER TABLE statements whose action starts at column 0. Writing the
+# kept fragments alongside gives the expected output of every cleaner
+# without running any of them, so each one is checked byte for byte and
+# timed (MiB/s of input) with its peak RSS, in a fresh process.
+#
+# The expected outputs are derived the same way the generator writes them,
+# so a small reference dump built from fixed fragments is checked first
+# against digests recorded in REFERENCE_DIGESTS; they change only when
+# the fragments do.
+#
+# Usage:
+#   python scripts/bench_clean.py                        # 1, 10 and 100 MiB
+#   python scripts/bench_clean.py --sizes 1,1024 --workers 8
+#   python scripts/bench_clean.py --compare .sync/bench_clean-baseline.json
+
+TEMPLATE_FILE = "supabase/migrations/clean_schema_final.sql"
+BENCH_FILE = os.path.join(".sync", "bench_clean.json")
+SIZES_MIB = [1, 10, 100]
+MIB = 1024 * 1024
+
+RULE_SETS = {
+    "owner": ["drop-owner"],
+    "owner-set": ["drop-owner", "drop-set"],
+    "owner-hanging": ["drop-owner", "drop-hanging-alter"],
+}
+
+# name -> (module, function, rule set its output must match)
+IMPLEMENTATIONS = {
+    "clean_sql": ("clean_sql", "clean_sql", "owner-set"),
+    "minimal_clean": ("minimal_clean_sql", "minimal_clean", "owner"),
+    "optimal_clean": ("smart_clean_sql", "optimal_clean", "owner"),
+    "definitive_clean": ("definitive_clean_sql", "definitive_clean", "owner-hanging"),
+    "fix_sql": ("fix_sql_dump", "fix_sql", "owner-hanging"),
+    "serial": ("clean_dump", "clean_dump", "owner-hanging"),
+    "parallel": ("clean_dump", "clean_dump", "owner-hanging"),
+    "compressed": ("clean_dump", "clean_dump", "owner-hanging"),
+}
+
+# Relative weights of the fragment kinds; COPY blocks are few but large,
+# so data ends up around two thirds of the bytes, as in a data dump
+FRAGMENT_WEIGHTS = {
+    "statement": 60,
+    "owner": 10,
+    "split-owner": 5,
+    "orphan-owner": 2,
+    "hanging-alter": 3,
+    "unindented-alter": 3,
+    "set": 5,
+    "copy": 2,
+    "function": 3,
+    "comment": 2,
+    "string": 2,
+    "quoted": 1,
+}
+COPY_ROWS = (200, 1200)
+
+# Reference dump: fixed templates and seed, so the expected outputs (and
+# every cleaner's output) have known sha256 digests
+REFERENCE_TEMPLATES = [
+    b'CREATE TABLE IF NOT EXISTS "public"."users" (\n    "id" "uuid" NOT NULL,\n    "email" "text"\n);',
+    b'ALTER TABLE ONLY "public"."users"\n    ADD CONSTRAINT "users_pkey" PRIMARY KEY ("id");',
+    b'CREATE INDEX "idx_events_tenant" ON "public"."events" USING "btree" ("tenant_id");',
+    b'CREATE POLICY "Users can view events" ON "public"."events" FOR SELECT USING (true);',
+    b'GRANT ALL ON TABLE "public"."event_rsvps" TO "service_role";',
+]
+REFERENCE_TABLES = ["public.users", "public.events", "public.event_rsvps"]
+REFERENCE_SIZE = 256 * 1024
+REFERENCE_SEED = 7
+REFERENCE_DIGESTS = {
+    "owner": "b038d6b7b774037460fa780318a1432b343fe02559a51cd5fbc5bf01c2c774ce",
+    "owner-set": "95e0e47db17482e0a5e95ef734607f658a859255925cc8c9b57873a17f99a929",
+    "owner-hanging": "19bd2a0a2d97b52b258e629de7b2b015d9a78e30246876fe0713d5901cbe1d1a",
+}
+
+def load_templates(path):
+    # Schema statements of a real dump that no rule drops: no owner
+    # assignments, no SET lines, no COPY blocks
+    templates = []
+    tables = []
+    with open(path, "rb") as f:
+        for statement in iter_statements(f):
+            body = statement.body.rstrip()
+            if not statement.kind or statement.kind in ("SET", "META", "COPY", "COPY DATA"):
+                continue
+            if b"OWNER TO" in body.upper():
+                continue
+            templates.append(body)
+            if statement.kind == "CREATE TABLE" and statement.target:
+                tables.append(statement.target)
+    return templates, tables or ["public.t"]
+
+def quoted(qualified):
+    return ".".join(f'"{part}"' for part in qualified.split("."))
+
+def fragment(kind, rng, templates, tables):
+    # [(bytes, rules that drop them)] for one fragment; every part starts on
+    # a blank line and ends with a newline, so whole parts come and go
+    table = quoted(rng.choice(tables))
+    if kind == "statement":
+        return [(b"\n" + rng.choice(templates) + b"\n", set())]
+    if kind == "owner":
+        return [(f'\nALTER TABLE ONLY {table} OWNER TO "postgres";\n'.encode(), {"drop-owner"})]
+    if kind == "split-owner":
+        return [(f'\nALTER TABLE ONLY {table}\n    OWNER TO "postgres";\n'.encode(), {"drop-owner"})]
+    if kind == "orphan-owner":
+        return [(b'\nOWNER TO "postgres";\n', {"drop-owner"})]
+    if kind == "hanging-alter":
+        # The header's action line was lost; the next command starts at
+        # column 0 and survives every rule
+        header = f"\nALTER TABLE ONLY {table}\n".encode()
+        index = f'\nCREATE INDEX "bench_idx_{rng.randrange(10**6)}" ON {table} USING "btree" ("id");\n'.encode()
+        return [(header, {"drop-hanging-alter"}), (index, set())]
+    if kind == "unindented-alter":
+        # Hand-written migrations put the action at column 0; the header is
+        # not hanging and the statement survives every rule
+        action = rng.choice([f'ADD COLUMN "bench_col_{rng.randrange(10**6)}" boolean NOT NULL DEFAULT false;',
+                             f'ADD CONSTRAINT "bench_check_{rng.randrange(10**6)}"\nCHECK ("id" IS NOT NULL);',
+                             'ALTER COLUMN "id" SET NOT NULL;', "ENABLE ROW LEVEL SECURITY;"])
+        return [(f"\n-- Add to {table}\nALTER TABLE {table}\n{action}\n".encode(), set())]
+    if kind == "set":
+        return [(f"\nSET statement_timeout = {rng.randrange(100)};\n".encode(), {"drop-set"})]
+    if kind == "function":
+        # Column 0 lines inside a dollar-quoted body are part of the function
+        tag = rng.choice(["$$", "$_$", "$body$"])
+        body = (f'\nCREATE OR REPLACE FUNCTION "public"."bench_fn_{rng.randrange(10**6)}"() RETURNS "trigger"\n'
+                f'    LANGUAGE "plpgsql"\n    AS {tag}\nBEGIN\n'
+                f"SET search_path = public;\n"
+                f'ALTER TABLE ONLY {table} OWNER TO "postgres";\n'
+                f"ALTER TABLE ONLY {table}\n"
+                f'OWNER TO "postgres";\n'
+                f"ALTER TABLE ONLY {table}\n"
+                f"RETURN NEW;\nEND;\n{tag};\n")
+        return [(body.encode(), set())]
+    if kind == "comment":
+        # Comments travel with the statement after them (a dropped statement
+        # takes its comment header along), so these lead a kept one
+        text = (f'\n-- ALTER TABLE ONLY {table} OWNER TO "postgres";\n-- SET statement_timeout = 0;\n'
+                f"-- ALTER TABLE ONLY {table}\n"
+                f"\n/* ALTER TABLE ONLY {table}\nSET search_path = x;\nOWNER TO \"postgres\"; */\n")
+        return [(text.encode() + b"\n" + rng.choice(templates) + b"\n", set())]
+    if kind == "string":
+        text = (f"\nCOMMENT ON TABLE {table} IS 'Don''t clean:\n"
+                f"SET search_path = x;\n"
+                f'ALTER TABLE ONLY {table} OWNER TO "postgres";\n'
+                f"ALTER TABLE ONLY {table}\n"
+                f"OWNER TO postgres;';\n")
+        return [(text.encode(), set())]
+    if kind == "quoted":
+        text = (f'\nCREATE TABLE "public"."OWNER TO ""bench_{rng.randrange(10**6)}"";" (\n'
+                f'    "SET search_path" "text",\n    "ALTER TABLE ONLY" integer\n);\n')
+        return [(text.encode(), set())]
+    lines = []
+    for i in range(rng.randint(*COPY_ROWS)):
+        note = rng.choice(["SET search_path = x;", "OWNER TO postgres;", "ALTER TABLE ONLY t", "plain"])
+        lines.append(f"{i}\t{note}\t{rng.random():.12f}\tsome text of a typical width here\n")
+    block = f'\nCOPY {table} ("id", "note", "score", "body") FROM stdin;\n{"".join(lines)}\\.\n'
+    return [(block.encode(), set())]
+
+def generate(path, size, templates, tables, seed=0):
+    # Writes a dump of about `size` bytes to path and the expected output for
+    # each rule set to path.<rule set>; returns the input size
+    rng = random.Random(seed)
+    kinds = list(FRAGMENT_WEIGHTS)
+    weights = [FRAGMENT_WEIGHTS[k] for k in kinds]
+    written = 0
+    with contextlib.ExitStack() as stack:
+        out = stack.enter_context(open(path, "wb"))
+        goldens = [(set(rules), stack.enter_context(open(f"{path}.{name}", "wb")))
+                   for name, rules in RULE_SETS.items()]
+        while written < size:
+            for data, dropped_by in fragment(rng.choices(kinds, weights)[0], rng, templates, tables):
+                out.write(data)
+                written += len(data)
+                for rules, golden in goldens:
+                    if not dropped_by & rules:
+                        golden.write(data)
+    return os.path.getsize(path)
+
+def content_digest(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    digest = hashlib.sha256()
+    with opener(path, "rb") as f:
+        while True:
+            data = f.read(MIB)
+            if not data:
+                return digest.hexdigest()
+            digest.update(data)
+
+def same_content(path, golden):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as a, open(golden, "rb") as b:
+        while True:
+            x = a.read(MIB)
+            y = b.read(MIB)
+            if x != y:
+                return False
+            if not x:
+                return True
+
+def run_one(name, input_path, output_path, workers):
+    # Runs one implementation in this process and prints its timing as JSON
+    module, function, _ = IMPLEMENTATIONS[name]
+    clean = getattr(importlib.import_module(module), function)
+    kwargs = {"workers": workers} if name == "parallel" else {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        clean(input_path, output_path, **kwargs)
+        seconds = time.perf_counter() - start
+    print(json.dumps({
+        "seconds": seconds,
+        # ru_maxrss is in KiB on Linux; workers report the largest one
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "worker_peak_rss_mib": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }))
+
+def run(name, input_path, work_dir, workers):
+    # Runs one implementation in a fresh process; returns its output path and timing
+    output_path = os.path.join(work_dir, f"out-{name}.sql")
+    if name == "compressed":
+        input_path += ".gz"
+        output_path += ".gz"
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-one", name, input_path, output_path,
+                           "--workers", str(workers)], capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(f"{name} failed:\n{proc.stderr}")
+    return output_path, json.loads(proc.stdout.strip().splitlines()[-1])
+
+def describe(result):
+    return f"{result['implementation']:<17} {result['size_mib']:>7} MiB"
+
+def measure(name, input_path, size, work_dir, workers):
+    rule_set = IMPLEMENTATIONS[name][2]
+    output_path, timing = run(name, input_path, work_dir, workers)
+    correct = same_content(output_path, f"{input_path}.{rule_set}")
+    os.remove(output_path)
+    result = {
+        "implementation": name,
+        "size_mib": round(size / MIB, 1),
+        "rule_set": rule_set,
+        "correct": correct,
+        "seconds": round(timing["seconds"], 3),
+        "mib_per_second": round(size / MIB / timing["seconds"], 1) if timing["seconds"] else None,
+        "peak_rss_mib": round(timing["peak_rss_mib"], 1),
+    }
+    if name == "parallel":
+        result["workers"] = workers
+        result["worker_peak_rss_mib"] = round(timing["worker_peak_rss_mib"], 1)
+    print(f"  {describe(result)}  {result['seconds']:8.2f}s  {result['mib_per_second'] or 0:>7.1f} MiB/s  "
+          f"{result['peak_rss_mib']:>7.1f} MiB RSS  {'ok' if correct else 'WRONG OUTPUT'}")
+    return result
+
+def write_inputs(input_path, size, templates, tables, names, seed=0):
+    size = generate(input_path, size, templates, tables, seed)
+    if "compressed" in names:
+        with open(input_path, "rb") as src, gzip.open(input_path + ".gz", "wb", compresslevel=1) as dst:
+            shutil.copyfileobj(src, dst, MIB)
+    return size
+
+def remove_inputs(input_path):
+    for path in [input_path, input_path + ".gz"] + [f"{input_path}.{name}" for name in RULE_SETS]:
+        if os.path.exists(path):
+            os.remove(path)
+
+def check_reference(work_dir, workers, names):
+    # Returns what disagrees with REFERENCE_DIGESTS: the generator's expected
+    # outputs, or an implementation's actual one
+    input_path = os.path.join(work_dir, "reference.sql")
+    write_inputs(input_path, REFERENCE_SIZE, REFERENCE_TEMPLATES, REFERENCE_TABLES, names, REFERENCE_SEED)
+    failures = [f"expected output for {rule_set}" for rule_set, digest in REFERENCE_DIGESTS.items()
+                if content_digest(f"{input_path}.{rule_set}") != digest]
+    for name in names:
+        output_path, _ = run(name, input_path, work_dir, workers)
+        if content_digest(output_path) != REFERENCE_DIGESTS[IMPLEMENTATIONS[name][2]]:
+            failures.append(name)
+        os.remove(output_path)
+    remove_inputs(input_path)
+    print(f"Reference dump: {'ok' if not failures else 'digest mismatch in ' + ', '.join(failures)}")
+    return failures
+
+def bench_size(size_mib, templates, tables, work_dir, workers, names):
+    input_path = os.path.join(work_dir, f"dump-{size_mib}mib.sql")
+    size = write_inputs(input_path, size_mib * MIB, templates, tables, names)
+    results = [measure(name, input_path, size, work_dir, workers) for name in names]
+    remove_inputs(input_path)
+    return results
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check the dump cleaners against expected output and time them.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in SIZES_MIB),
+                        help="Comma-separated dump sizes in MiB (default 1, 10, 100; 1024 for 1 GiB)")
+    parser.add_argument("--implementations", default=",".join(IMPLEMENTATIONS),
+                        help="Comma-separated implementations to run (default: all)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2,
+                        help="Processes for the parallel implementation (default: every core)")
+    parser.add_argument("--template", default=TEMPLATE_FILE,
+                        help=f"Schema dump the statements are taken from (default {TEMPLATE_FILE})")
+    parser.add_argument("--work-dir", help="Where to write the generated dumps (default: a temporary directory)")
+    parser.add_argument("--output", default=BENCH_FILE, help=f"Where to write results (default {BENCH_FILE})")
+    parser.add_argument("--compare", metavar="BASELINE", help="Earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline before failing (default 0.2 = 20%%)")
+    parser.add_argument("--run-one", nargs=3, metavar=("NAME", "INPUT", "OUTPUT"), help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.run_one:
+        run_one(*args.run_one, args.workers)
+        return
+    names = [name for name in args.implementations.split(",") if name]
+    unknown = [name for name in names if name not in IMPLEMENTATIONS]
+    if unknown:
+        raise SystemExit(f"Unknown implementations: {', '.join(unknown)}")
+    templates, tables = load_templates(args.template)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_clean-")
+    os.makedirs(work_dir, exist_ok=True)
+    results = []
+    try:
+        reference_failures = check_reference(work_dir, args.workers, names)
+        for size_mib in [int(s) for s in args.sizes.split(",") if s]:
+            print(f"Benchmarking {size_mib} MiB...")
+            results.extend(bench_size(size_mib, templates, tables, work_dir, args.workers, names))
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "reference_failures": reference_failures,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Wrote {args.output}")
+    wrong = [r for r in results if not r["correct"]]
+    for r in wrong:
+        print(f"  {r['implementation']} produced wrong output at {r['size_mib']} MiB")
+    regressions = (compare(results, args.compare, args.tolerance, ("implementation", "size_mib"), describe)
+                   if args.compare else [])
+    if wrong or reference_failures or regressions:
+        exit(1)
+
+if __name__ == "__main__":
+    main()
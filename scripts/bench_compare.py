@@ -0,0 +1,24 @@
+import json
+
+# Baseline comparison shared by the benchmarks (bench_sync.py, bench_clean.py):
+# results are matched to the baseline's on their key fields, and any that got
+# slower by more than the tolerance are reported as regressions.
+
+def compare(results, baseline_path, tolerance, keys, describe):
+    # Returns the keys of the results that got slower than the baseline by more
+    # than tolerance; describe(result) labels a result in the printout
+    with open(baseline_path, "r") as f:
+        baseline = {tuple(r.get(k) for k in keys): r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"Compared with {baseline_path}:")
+    for r in results:
+        key = tuple(r.get(k) for k in keys)
+        old = baseline.get(key)
+        if not old or not old["seconds"]:
+            continue
+        ratio = r["seconds"] / old["seconds"]
+        flag = "  REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"  {describe(r)}  {old['seconds']:8.2f}s -> {r['seconds']:8.2f}s  ({ratio:.2f}x){flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
@@ -0,0 +1,367 @@
+import argparse
+import calendar
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from functools import partial
+
+import sync_data
+from bench_compare import compare
+from sync_scheduler import run_dag
+from sync_schema import SCHEMA_FILE, deferred_foreign_keys, load_schema, primary_key, table_dependencies
+
+# Benchmark for sync_data.sync_table against an in-process stand-in for the
+# supabase client. Synthetic rows are generated from the real schema dump,
+# so row widths match production tables. Every request round-trips its
+# payload through JSON, like the HTTP client does, and can be given a
+# simulated network latency. Dev can mimic the BEFORE UPDATE triggers that
+# set updated_at on every update, which a --diff run must not mistake for a
+# change.
+#
+# Usage:
+#   python scripts/bench_sync.py                          # 10k and 100k rows
+#   python scripts/bench_sync.py --sizes 10000,100000,1000000  # opt in to 1M rows (slow, memory-hungry)
+#   python scripts/bench_sync.py --sizes 10000 --latency-ms 20
+#   python scripts/bench_sync.py --compare .sync/bench-baseline.json
+
+BENCH_FILE = os.path.join(sync_data.SYNC_DIR, "bench.json")
+SIZES = [10_000, 100_000]
+
+# Share of the generated rows per table; tenants get one per 20k rows
+TABLE_SHARES = {
+    "users": 0.15,
+    "events": 0.10,
+    "announcements": 0.05,
+    "notifications": 0.25,
+    "event_rsvps": 0.45,
+}
+BENCH_TABLES = ["tenants"] + list(TABLE_SHARES)
+
+# Share of rows touched between the full run and the delta run
+DELTA_FRACTION = 0.01
+
+# Generated rows are stamped one second apart from BASE_TIME; touched rows
+# move to LATER_TIME, after every generated stamp
+BASE_TIME = calendar.timegm((2024, 1, 1, 0, 0, 0))
+LATER_TIME = "2025-01-01T00:00:00+00:00"
+# What dev's updated_at trigger writes on an update
+TRIGGER_TIME = "2026-01-01T00:00:00+00:00"
+
+class FakeQuery:
+    # The subset of the postgrest query builder that sync_data uses. Reads
+    # seek into a sorted index with bisect, so paging a 1M row table stays
+    # linear overall instead of rescanning per page.
+
+    def __init__(self, db, table_name):
+        self.db = db
+        self.table_name = table_name
+        self.columns = "*"
+        self.filters = []
+        self.ordering = []
+        self.count = None
+        self.payload = None
+        self.op = "select"
+
+    def select(self, columns="*"):
+        self.columns = columns
+        return self
+
+    def order(self, column, desc=False):
+        self.ordering.append(column)
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(("gt", column, value))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(("gte", column, value))
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(("eq", column, value))
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(("in", column, set(values)))
+        return self
+
+    def or_(self, expression):
+        # Only the delta keyset form fetch_pages builds:
+        #   ts.gt."v",and(ts.eq."v",key.gt.k)
+        head, _, rest = expression.partition(",and(")
+        column, _, value = head.split(".", 2)
+        key_part = rest.rstrip(")").split(",", 1)[1]
+        key, _, last = key_part.split(".", 2)
+        self.filters.append(("keyset", (column, key), (value.strip('"'), last)))
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self.op = "upsert"
+        self.payload = rows
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def execute(self):
+        return self.db.execute(self)
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+def matches(row, op, column, value):
+    if op == "keyset":
+        return tuple(row.get(c) or "" for c in column) > value
+    have = row.get(column)
+    if op == "eq":
+        return have == value
+    if op == "in":
+        return have in value
+    if have is None:
+        return False
+    return have > value if op == "gt" else have >= value
+
+class FakeSupabase:
+    # In-memory PostgREST stand-in: tables are {primary key: row}. With
+    # triggers, an upsert that updates an existing row stamps its updated_at
+    # with TRIGGER_TIME, like dev's set_updated_at triggers.
+
+    def __init__(self, schema, tables=None, latency=0.0, triggers=False):
+        self.schema = schema
+        self.tables = tables or {}
+        self.latency = latency
+        self.triggers = triggers
+        self.requests = 0
+        self.indexes = {}
+
+    def table(self, table_name):
+        return FakeQuery(self, table_name)
+
+    def index(self, table_name, ordering):
+        cached = self.indexes.get((table_name, ordering))
+        if cached is None:
+            rows = sorted(self.tables.get(table_name, {}).values(),
+                          key=lambda row: tuple(row.get(c) or "" for c in ordering))
+            keys = [tuple(row.get(c) or "" for c in ordering) for row in rows]
+            cached = self.indexes[(table_name, ordering)] = (keys, rows)
+        return cached
+
+    def execute(self, query):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        table = self.tables.setdefault(query.table_name, {})
+        key = primary_key(self.schema, query.table_name)
+        if query.op == "upsert":
+            for row in json.loads(json.dumps(query.payload, default=str)):
+                if self.triggers and row[key] in table and "updated_at" in row:
+                    row["updated_at"] = TRIGGER_TIME
+                table[row[key]] = row
+            self.indexes = {k: v for k, v in self.indexes.items() if k[0] != query.table_name}
+            return FakeResponse([])
+        if query.op == "delete":
+            doomed = [k for k, row in table.items() if all(matches(row, *f) for f in query.filters)]
+            for k in doomed:
+                del table[k]
+            self.indexes = {k: v for k, v in self.indexes.items() if k[0] != query.table_name}
+            return FakeResponse([])
+
+        ordering = tuple(query.ordering) or (key,)
+        keys, rows = self.index(query.table_name, ordering)
+        # Seek past rows a range filter on the leading order column excludes
+        start = 0
+        for op, column, value in query.filters:
+            if op == "gte" and column == ordering[0]:
+                start = max(start, bisect_left(keys, (value,)))
+            elif op == "gt" and column == ordering[0]:
+                start = max(start, bisect_right(keys, (value, chr(0x10FFFF))))
+            elif op == "keyset" and column == ordering[:2]:
+                start = max(start, bisect_right(keys, value))
+        page = []
+        for i in range(start, len(rows)):
+            row = rows[i]
+            if all(matches(row, *f) for f in query.filters):
+                page.append(row if query.columns == "*" else
+                            {c: row.get(c) for c in query.columns.split(",")})
+                if query.count and len(page) >= query.count:
+                    break
+        return FakeResponse(json.loads(json.dumps(page, default=str)))
+
+def fake_value(column, i, rng):
+    if column == "id" or column.endswith("_id") or column in ("created_by", "cancelled_by"):
+        return str(uuid.UUID(int=rng.getrandbits(128)))
+    if column.endswith("_at"):
+        return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(BASE_TIME + i))
+    if column.startswith(("is_", "has_")) or column.endswith("_enabled"):
+        return bool(i % 2)
+    return f"{column} {i}"
+
+def generate(schema, total, seed=0):
+    # Synthetic prod data: every column of the real table is filled, and
+    # foreign keys between the benchmark tables point at generated parents
+    rng = random.Random(seed)
+    counts = {"tenants": max(1, total // 20000)}
+    counts.update({t: max(1, int(total * share)) for t, share in TABLE_SHARES.items()})
+    tables = {}
+    keys = {}
+    for table_name in BENCH_TABLES:
+        info = schema[table_name]
+        key = primary_key(schema, table_name)
+        refs = {fk["columns"][0]: fk["references"] for fk in info["foreign_keys"]}
+        rows = {}
+        for i in range(counts[table_name]):
+            row = {column: fake_value(column, i, rng) for column in info["columns"]}
+            for column, parent in refs.items():
+                parent_keys = keys.get(parent)
+                row[column] = rng.choice(parent_keys) if parent_keys and parent != table_name else None
+            rows[row[key]] = row
+        tables[table_name] = rows
+        keys[table_name] = list(rows)
+    return tables
+
+def touch(tables, fraction, seed=1):
+    # Bump updated_at (or created_at) on a slice of every table for the delta run
+    rng = random.Random(seed)
+    touched = 0
+    for rows in tables.values():
+        for row in rng.sample(list(rows.values()), max(1, int(len(rows) * fraction))):
+            row["updated_at" if "updated_at" in row else "created_at"] = LATER_TIME
+            touched += 1
+    return touched
+
+def run_sync(prod, dev, schema, workers, state=None, diff=False):
+    # The same load / back-fill DAG sync_data.main builds, on BENCH_TABLES
+    deferred = deferred_foreign_keys(schema, BENCH_TABLES)
+    deferred_columns = {}
+    for table_name, column in sorted(deferred):
+        deferred_columns.setdefault(table_name, []).append(column)
+    dependencies = table_dependencies(schema, BENCH_TABLES, deferred=deferred)
+    metrics = {}
+    held = {}
+
+    def load(name):
+        held[name] = sync_data.sync_table(prod, dev, name, schema=schema, state=state, metrics=metrics,
+                                          diff=diff, deferred_columns=deferred_columns.get(name, ()))
+
+    def backfill(name):
+        sync_data.backfill_table(dev, name, held.get(name), deferred_columns[name], schema, metrics=metrics.get(name))
+
+    jobs = {name: partial(load, name) for name in BENCH_TABLES}
+    for table_name, columns in deferred_columns.items():
+        job = f"{table_name}:backfill"
+        jobs[job] = partial(backfill, table_name)
+        parents = {fk["references"] for fk in schema[table_name]["foreign_keys"]
+                   if set(fk["columns"]) & set(columns)}
+        dependencies[job] = {table_name} | (parents & set(BENCH_TABLES))
+
+    start = time.monotonic()
+    run_dag(jobs, dependencies, max_workers=workers)
+    return time.monotonic() - start, metrics
+
+def describe(result):
+    return f"{result['mode']:<8} {result['rows']:>9} rows"
+
+def measure(prod, dev, schema, mode, rows, workers, state=None, diff=False):
+    prod.requests = dev.requests = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        seconds, metrics = run_sync(prod, dev, schema, workers, state, diff)
+    fetched = sum(m.counts["rows_fetched"] for m in metrics.values())
+    errors = sum(m.counts["errors"] + m.counts["failed"] for m in metrics.values())
+    result = {
+        "mode": mode,
+        "rows": rows,
+        "workers": workers,
+        "seconds": round(seconds, 3),
+        "rows_fetched": fetched,
+        "rows_per_second": round(fetched / seconds, 1) if seconds else None,
+        "requests": {"prod": prod.requests, "dev": dev.requests},
+        "errors": errors,
+        "rows_rewritten": sum(m.counts["updated"] for m in metrics.values()) if diff else None,
+        "tables": {name: m.to_dict() for name, m in sorted(metrics.items())},
+    }
+    print(f"  {describe(result)}  {seconds:8.2f}s  {result['rows_per_second'] or 0:>10.0f} rows/s  "
+          f"{prod.requests + dev.requests:>6} requests" + (f"  {errors} errors" if errors else "")
+          + (f"  {result['rows_rewritten']} rewritten" if result["rows_rewritten"] else ""))
+    return result
+
+def bench_size(schema, total, workers, latency):
+    tables = generate(schema, total)
+    rows = sum(len(t) for t in tables.values())
+    results = []
+
+    # full: sequential, into an empty dev
+    prod = FakeSupabase(schema, tables, latency)
+    dev = FakeSupabase(schema, latency=latency, triggers=True)
+    results.append(measure(prod, dev, schema, "full", rows, 1))
+
+    # parallel: the same full copy with concurrent tables
+    dev = FakeSupabase(schema, latency=latency, triggers=True)  # drop the first copy before the second
+    state = {}
+    results.append(measure(prod, dev, schema, "parallel", rows, workers, state))
+
+    # delta: watermarks from the parallel run, then a slice of rows changes
+    touch(tables, DELTA_FRACTION)
+    prod.indexes = {}
+    results.append(measure(prod, dev, schema, "delta", rows, workers, state))
+
+    # diff: dev now matches prod except for the trigger-stamped updated_at,
+    # so a --diff run should find nothing to rewrite
+    results.append(measure(prod, dev, schema, "diff", rows, workers, diff=True))
+    return results
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark sync_data against an in-memory supabase stand-in.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in SIZES),
+                        help="Comma-separated total row counts (default 10k, 100k; pass 1000000 explicitly for 1M)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent tables in the parallel and delta runs")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Simulated round-trip time per request")
+    parser.add_argument("--schema", default=SCHEMA_FILE,
+                        help=f"Schema dump the synthetic tables are generated from (default {SCHEMA_FILE})")
+    parser.add_argument("--output", default=BENCH_FILE, help=f"Where to write results (default {BENCH_FILE})")
+    parser.add_argument("--compare", metavar="BASELINE", help="Earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline before failing (default 0.2 = 20%%)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    schema = load_schema(args.schema)
+    results = []
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        print(f"Benchmarking {size} rows...")
+        results.extend(bench_size(schema, size, args.workers, args.latency_ms / 1000))
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "latency_ms": args.latency_ms,
+        "workers": args.workers,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Wrote {args.output}")
+    rewritten = [r for r in results if r["rows_rewritten"]]
+    for r in rewritten:
+        print(f"  diff run at {r['rows']} rows rewrote {r['rows_rewritten']} unchanged rows")
+    regressions = compare(results, args.compare, args.tolerance, ("mode", "rows"), describe) if args.compare else []
+    if regressions or rewritten:
+        exit(1)
+
+if __name__ == "__main__":
+    main()
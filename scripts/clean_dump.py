@@ -0,0 +1,253 @@
+import argparse
+import mmap
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from dump_io import COMPRESSIONS, DumpInput, DumpOutput, is_mappable
+from dump_rules import BLANK_OR_COMMENT_LINES, HANGING_ALTER, KNOWN_ROLES, RULES, RuleSet
+from sql_dump import Statement, iter_buffer, parse_head
+
+# Statement-level cleaner for pg_dump output. Replaces the line-based
+# clean_sql.py / minimal_clean_sql.py / smart_clean_sql.py /
+# definitive_clean_sql.py / fix_sql_dump.py, which are now thin wrappers
+# around clean_dump() with the rules they were written for.
+#
+# Usage:
+#   python scripts/clean_dump.py fresh_dump.sql clean.sql
+#   python scripts/clean_dump.py fresh_dump.sql clean.sql --rule drop-owner --rule drop-set
+#   python scripts/clean_dump.py init_from_prod.sql clean.sql --workers 8
+#   python scripts/clean_dump.py dump.sql.gz clean.sql.zst
+#   pg_dump ... | python scripts/clean_dump.py - - | psql ...
+#   python scripts/clean_dump.py init_from_prod.sql schema.sql --split-data data/
+
+# A line that names a table and nothing else: the header of a multi-line
+# ALTER TABLE whose action line is missing (left behind by older cleaners).
+# Same patterns, and case handling, as the drop-hanging-alter rule.
+HANGING_ALTER_RE = re.compile(HANGING_ALTER.encode(), re.IGNORECASE)
+BLANK_OR_COMMENT_LINE_RE = re.compile(BLANK_OR_COMMENT_LINES.encode())
+
+DEFAULT_RULES = ["drop-owner", "drop-hanging-alter"]
+
+# COPY ... FROM stdin header: the table and column list, then any options
+COPY_FROM_STDIN_RE = re.compile(rb"COPY\s+(.*?)\s+FROM\s+stdin\b(.*?);", re.IGNORECASE | re.DOTALL)
+# The "\." line that ends the last piece of a COPY data block
+COPY_TERMINATOR_RE = re.compile(rb"(?:^|(?<=\n))\\\.(?:\r?\n)?\Z")
+
+# --workers splits the dump into byte ranges of about this size
+PARALLEL_CHUNK_SIZE = 16 * 1024 * 1024
+# Bytes searched after a range's nominal start for a likely statement end
+BOUNDARY_WINDOW = 64 * 1024
+# pg_dump follows each statement with a blank line; a bare ";\n" is the fallback
+BOUNDARY_RES = [re.compile(rb";[ \t]*\r?\n(?=\r?\n)"), re.compile(rb";[ \t]*\r?\n")]
+
+def reparse(raw, offset):
+    # Statement for a slice of raw dump bytes
+    body_start = BLANK_OR_COMMENT_LINE_RE.match(raw).end()
+    body_start += len(raw[body_start:]) - len(raw[body_start:].lstrip())
+    kind, target = parse_head(raw[body_start:body_start + 256].decode("utf-8", "replace"))
+    return Statement(raw, offset, body_start, kind, target)
+
+def split_hanging_alter(statement):
+    # Splits hanging "ALTER TABLE name" header lines off the front of a
+    # statement. A header has lost its action when what follows it is a new
+    # top-level command (or nothing); action lines, indented by pg_dump or at
+    # column 0 in hand-written migrations, keep the statement whole.
+    # Returns (headers, rest); rest may be None.
+    headers = []
+    while statement.kind == "ALTER TABLE":
+        raw = statement.raw
+        m = HANGING_ALTER_RE.match(raw, statement.body_start)
+        if m is None:
+            break
+        headers.append(Statement(raw[:m.end()], statement.offset, statement.body_start, "ALTER TABLE",
+                                 statement.target))
+        rest = raw[m.end():]
+        if not rest:
+            return headers, None
+        statement = reparse(rest, statement.offset + m.end())
+    return headers, statement
+
+def clean_statements(statements, rules):
+    # Yields the statements that survive `rules` (a dump_rules.RuleSet)
+    for statement in statements:
+        matched = rules.match(statement)
+        if matched and matched[1] == "split":
+            headers, statement = split_hanging_alter(statement)
+            rules.hit(matched[0], len(headers))
+            if statement is None:
+                continue
+            matched = rules.match(statement)
+        if matched:
+            rules.hit(matched[0])
+            continue
+        yield statement
+
+def split_copy_data(statements, data_dir):
+    # Writes each table's COPY data to data_dir/<table>.copy and turns its
+    # COPY ... FROM stdin into a psql "\copy ... FROM '<file>'" line, so the
+    # dump shrinks to the schema but still restores with psql (run from the
+    # directory data_dir is relative to)
+    os.makedirs(data_dir, exist_ok=True)
+    used = set()
+    data_file = None
+    try:
+        for statement in statements:
+            if statement.kind == "COPY DATA" and data_file is not None:
+                m = COPY_TERMINATOR_RE.search(statement.raw, max(0, len(statement.raw) - 4))
+                data_file.write(statement.raw[:m.start()] if m else statement.raw)
+                if m:
+                    data_file.close()
+                    data_file = None
+                continue
+            m = COPY_FROM_STDIN_RE.match(statement.raw, statement.body_start) if statement.kind == "COPY" else None
+            if m:
+                name = re.sub(r"[^\w.-]", "_", statement.target or "data")
+                path = os.path.join(data_dir, f"{name}.copy")
+                n = 2
+                while path in used:
+                    path = os.path.join(data_dir, f"{name}.{n}.copy")
+                    n += 1
+                used.add(path)
+                data_file = open(path, 'wb')
+                command = b"\\copy %s FROM '%s'%s\n" % (m.group(1), path.replace("'", "''").encode(), m.group(2))
+                statement = Statement(statement.raw[:statement.body_start] + command, statement.offset,
+                                      statement.body_start, "META")
+            yield statement
+    finally:
+        if data_file is not None:
+            data_file.close()
+
+def clean_dump(input_path, output_path, rules=DEFAULT_RULES, roles=KNOWN_ROLES, workers=1, compression=None,
+               data_dir=None):
+    # One streaming pass from input_path to output_path; returns {rule: hits}.
+    # Either path may be "-" and either may be gzip or zstd compressed;
+    # workers > 1 needs a plain input file and falls back to one otherwise.
+    # data_dir moves COPY data out to one file per table (see split_copy_data)
+    # and also runs in one process.
+    if workers > 1 and data_dir is None and is_mappable(input_path):
+        return clean_dump_parallel(input_path, output_path, rules, roles, workers, compression=compression)
+    rule_set = RuleSet(rules, roles)
+    with DumpInput(input_path) as statements, DumpOutput(output_path, compression) as out:
+        statements = clean_statements(statements, rule_set)
+        if data_dir is not None:
+            statements = split_copy_data(statements, data_dir)
+        for statement in statements:
+            out.write(statement.raw)
+    return rule_set.counts
+
+def candidate_boundaries(f, size, chunk_size=PARALLEL_CHUNK_SIZE):
+    # Offsets about chunk_size apart that look like statement ends. They are
+    # guesses (function bodies and COPY data have ";\n" too): clean_range
+    # reports where a range really stopped and clean_dump_parallel corrects.
+    boundaries = [0]
+    for nominal in range(chunk_size, size, chunk_size):
+        if nominal <= boundaries[-1]:
+            continue
+        f.seek(nominal)
+        window = f.read(BOUNDARY_WINDOW)
+        for boundary_re in BOUNDARY_RES:
+            m = boundary_re.search(window)
+            if m:
+                if nominal + m.end() < size:
+                    boundaries.append(nominal + m.end())
+                break
+    boundaries.append(size)
+    return boundaries
+
+def clean_range(input_path, start, end, rules, roles=KNOWN_ROLES):
+    # Cleans the statements from `start`, which must be a statement end
+    # outside COPY data (or 0), through the first such end at or after `end`.
+    # Returns (cleaned bytes, {rule: hits}, offset where it stopped).
+    rule_set = RuleSet(rules, roles)
+    stop = start
+
+    def statements(reader):
+        nonlocal stop
+        for statement in reader:
+            stop = statement.offset + len(statement.raw)
+            yield statement
+            if stop >= end and reader.copy_target is None:
+                return
+
+    with open(input_path, 'rb') as src, mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        output = [statement.raw for statement in
+                  clean_statements(statements(iter_buffer(buffer, start)), rule_set)]
+    return b"".join(output), rule_set.counts, stop
+
+def clean_dump_parallel(input_path, output_path, rules, roles, workers, chunk_size=PARALLEL_CHUNK_SIZE,
+                        compression=None):
+    # Cleans byte ranges of the dump on a process pool and writes them back in
+    # order. A range only counts if it starts where the previous one stopped;
+    # the statements up to that point were then tokenized exactly as a serial
+    # pass would, so the output is byte-identical to clean_dump(workers=1).
+    # When a guessed boundary fell inside a statement, the range is redone
+    # from the real one.
+    counts = {name: 0 for name in dict.fromkeys(rules)}
+    with open(input_path, 'rb') as src:
+        boundaries = candidate_boundaries(src, os.fstat(src.fileno()).st_size, chunk_size)
+    ranges = iter(zip(boundaries, boundaries[1:]))
+    pending = deque()
+    position = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool, DumpOutput(output_path, compression) as out:
+
+        def submit():
+            for start, end in ranges:
+                pending.append((start, end, pool.submit(clean_range, input_path, start, end, rules, roles)))
+                return
+
+        for _ in range(workers * 2):  # bounds the cleaned ranges held in memory
+            submit()
+        while pending:
+            start, end, future = pending.popleft()
+            submit()
+            if end <= position:
+                future.cancel()  # the previous range ran through all of this one
+                continue
+            if start == position:
+                data, range_counts, position = future.result()
+            else:
+                future.cancel()
+                data, range_counts, position = clean_range(input_path, position, end, rules, roles)
+            out.write(data)
+            for name, hits in range_counts.items():
+                counts[name] += hits
+    return counts
+
+def print_counts(counts, file=None):
+    for name, hits in counts.items():
+        print(f"  {name}: {hits} removed", file=file)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Clean a pg_dump file statement by statement.")
+    parser.add_argument("input", help="Dump to read: plain, gzip or zstd; - for stdin")
+    parser.add_argument("output", help="Cleaned dump to write; .gz / .zst compress it, - for stdout")
+    parser.add_argument("--rule", action="append", choices=list(RULES),
+                        help=f"Rule to apply; repeatable (default: {', '.join(DEFAULT_RULES)})")
+    parser.add_argument("--role", action="append",
+                        help="Role that exists in the target, for drop-grants-to-missing-roles; "
+                             "repeatable (default: the standard Supabase roles)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help=f"Processes to clean with; the output is the same for any number "
+                             f"(default: 1, {os.cpu_count()} cores here)")
+    parser.add_argument("--compress", choices=COMPRESSIONS,
+                        help="Compression for the output (default: from its extension, none for stdout)")
+    parser.add_argument("--split-data", metavar="DIR",
+                        help="Write each table's COPY data to DIR/<table>.copy and load it with \\copy instead")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    counts = clean_dump(args.input, args.output, args.rule or DEFAULT_RULES, args.role or KNOWN_ROLES,
+                        args.workers, args.compress, args.split_data)
+    # Keep stdout for the dump itself when it is part of a pipeline
+    log_file = sys.stderr if args.output == "-" else sys.stdout
+    print_counts(counts, log_file)
+    print(f"Cleaned SQL written to {args.output}", file=log_file)
+    if args.split_data:
+        print(f"Table data written to {args.split_data}", file=log_file)
+
+if __name__ == "__main__":
+    main()
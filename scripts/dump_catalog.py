@@ -0,0 +1,298 @@
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import sys
+from collections import Counter
+
+from dump_io import DumpInput, is_mappable
+from dump_rules import HEAD_BYTES
+from sql_dump import WORD_RE, read_name, unquote
+
+# Object catalog of a pg_dump file: one pass records every statement's
+# object (type, schema, name, the table it belongs to, dependencies) and its
+# byte offset and length, in .sync/catalogs/ (git-ignored, so catalogs of
+# dumps under supabase/migrations stay out of commits). Extraction then
+# seeks straight to the wanted statements instead of scanning the dump.
+#
+# Usage:
+#   python scripts/dump_catalog.py clean_schema_final.sql                  # build, print a summary
+#   python scripts/dump_catalog.py clean_schema_final.sql --type policy --table users
+#   python scripts/dump_catalog.py clean_schema_final.sql --table events --type table --type index
+#   python scripts/dump_catalog.py clean_schema_final.sql --name "handle_*" --list
+
+CATALOG_VERSION = 1
+CATALOG_DIR = os.path.join(".sync", "catalogs")
+
+# Objects other statements can depend on
+DEPENDABLE_TYPES = {"TABLE", "VIEW", "MATERIALIZED VIEW", "TYPE", "DOMAIN", "SEQUENCE", "FUNCTION", "PROCEDURE"}
+# Objects defined ON a table
+TABLE_OBJECT_TYPES = {"INDEX", "POLICY", "TRIGGER", "RULE", "CONSTRAINT TRIGGER"}
+ROUTINE_TYPES = {"FUNCTION", "PROCEDURE", "AGGREGATE", "ROUTINE"}
+
+QUALIFIED_NAME_RE = re.compile(r'("(?:[^"]|"")*"|[A-Za-z_][\w$]*)\s*\.\s*("(?:[^"]|"")*"|[A-Za-z_][\w$]*)')
+
+def catalog_path(dump_path):
+    # One file per dump: its name, plus a hash of its absolute path so two
+    # dumps with the same name don't share a catalog
+    tag = hashlib.blake2b(os.path.abspath(dump_path).encode(), digest_size=4).hexdigest()
+    return os.path.join(CATALOG_DIR, f"{os.path.basename(dump_path)}.{tag}.catalog.json")
+
+def normalize(text):
+    # Whitespace-insensitive form of a statement, without its ";"
+    return " ".join(text.split()).rstrip(";").rstrip()
+
+def split_name(qualified):
+    # "public.users" -> ("public", "users"); "users" -> (None, "users")
+    if qualified is None:
+        return None, None
+    schema, _, name = qualified.partition(".")
+    return (schema, name) if name else (None, schema)
+
+def signature(text):
+    # Argument list of a routine: the first balanced (...) in its statement
+    i = text.find("(")
+    if i < 0:
+        return ""
+    depth = 0
+    for j in range(i, len(text)):
+        if text[j] == "(":
+            depth += 1
+        elif text[j] == ")":
+            depth -= 1
+            if depth == 0:
+                return normalize(text[i:j + 1])
+    return normalize(text[i:])
+
+def name_after(words, upper, keyword, start=0):
+    # Qualified name following `keyword` (skipping ONLY) at or after words[start]
+    try:
+        i = upper.index(keyword, start) + 1
+    except ValueError:
+        return None
+    while i < len(upper) and upper[i] in ("ONLY", "IF", "EXISTS"):
+        i += 1
+    return read_name(words, i)[0]
+
+def identify(statement):
+    # (type, schema, name, table, detail) of the object a statement defines
+    # or changes, or None for comments, psql meta-commands and COPY data.
+    # detail tells apart statements about the same object (two GRANTs on a
+    # table, several ALTER TABLE actions) and is None when it isn't needed.
+    kind, target = statement.kind, statement.target
+    if kind in ("", "META", "COPY DATA"):
+        return None
+    text = statement.text(HEAD_BYTES)
+    words = WORD_RE.findall(text)
+    upper = [w.upper() for w in words]
+    schema, name = split_name(target)
+
+    if kind == "COPY":
+        return "TABLE DATA", schema, name, target, None
+    if kind.startswith("CREATE "):
+        object_type = kind[len("CREATE "):]
+        if object_type in TABLE_OBJECT_TYPES:
+            table = name_after(words, upper, "ON")
+            return object_type, split_name(table)[0], target, table, None
+        if object_type in ROUTINE_TYPES:
+            return object_type, schema, f"{name}{signature(text)}", None, None
+        table = target if object_type in ("TABLE", "VIEW", "MATERIALIZED VIEW", "FOREIGN TABLE") else None
+        return object_type, schema, name, table, None
+    if kind == "ALTER TABLE":
+        # ALTER TABLE [ONLY] name <action> ...
+        i = 2
+        while i < len(upper) and upper[i] in ("ONLY", "IF", "EXISTS"):
+            i += 1
+        _, i = read_name(words, i)
+        action = upper[i:i + 6]
+        if action[:2] == ["ADD", "CONSTRAINT"] and i + 2 < len(words):
+            return "CONSTRAINT", schema, unquote(words[i + 2]), target, None
+        if action[:2] == ["ALTER", "COLUMN"] and "DEFAULT" in action and i + 2 < len(words):
+            return "DEFAULT", schema, unquote(words[i + 2]), target, None
+        if action[:2] == ["OWNER", "TO"]:
+            return "OWNER", schema, name, target, None
+        if action[:4] == ["ENABLE", "ROW", "LEVEL", "SECURITY"]:
+            return "ROW LEVEL SECURITY", schema, name, target, None
+        return "ALTER TABLE", schema, name, target, normalize(" ".join(words[i:]))
+    if kind.startswith("ALTER "):
+        object_type = kind[len("ALTER "):]
+        if object_type in ROUTINE_TYPES:
+            name = f"{name}{signature(text)}"
+        return kind, schema, name, None, normalize(text)
+    if kind.startswith("COMMENT ON "):
+        object_type = kind[len("COMMENT ON "):]
+        if object_type in ("COLUMN",):
+            table = target.rsplit(".", 1)[0] if target and target.count(".") > 1 else None
+        elif object_type in TABLE_OBJECT_TYPES:
+            table = name_after(words, upper, "ON", 2)
+        elif object_type in ("TABLE", "VIEW", "MATERIALIZED VIEW"):
+            table = target
+        else:
+            table = None
+        if object_type in ROUTINE_TYPES:
+            name = f"{name}{signature(text)}"
+        if schema is None and table:
+            schema = split_name(table)[0]
+        return "COMMENT", schema, f"{object_type} {name}", table, None
+    if kind in ("GRANT", "REVOKE"):
+        on_table = "ON" in upper and upper[upper.index("ON") + 1:upper.index("ON") + 2] == ["TABLE"]
+        return kind, schema, name, target if on_table else None, normalize(text)
+    if kind in ("SET", "RESET"):
+        return kind, None, target, None, None
+    return kind, schema, name, None, normalize(text)
+
+def references(statement):
+    # Qualified names a statement mentions ("public.users", ...)
+    found = set()
+    for m in QUALIFIED_NAME_RE.finditer(statement.text()):
+        found.add(f"{unquote(m.group(1))}.{unquote(m.group(2))}")
+    return found
+
+def dependable_key(entry):
+    # "schema.name" other statements use to refer to an entry's object
+    if entry["type"] not in DEPENDABLE_TYPES or not entry["schema"]:
+        return None
+    return f"{entry['schema']}.{entry['name'].split('(')[0]}"
+
+def build_catalog(dump_path):
+    # One pass over the dump; returns the catalog dict
+    entries = []
+    refs = []
+    copy_entry = None
+    with DumpInput(dump_path) as statements:
+        for statement in statements:
+            if statement.kind == "COPY DATA":
+                if copy_entry is not None:
+                    copy_entry["length"] += len(statement.raw)
+                continue
+            identity = identify(statement)
+            if identity is None:
+                continue
+            object_type, schema, name, table, detail = identity
+            entry = {"type": object_type, "schema": schema, "name": name, "table": table, "detail": detail,
+                     "dependencies": [], "offset": statement.offset + statement.body_start,
+                     "length": len(statement.raw) - statement.body_start}
+            entries.append(entry)
+            refs.append(set() if object_type == "TABLE DATA" else references(statement))
+            copy_entry = entry if object_type == "TABLE DATA" else None
+
+    # Keep the references that name objects of this dump
+    known = {dependable_key(entry) for entry in entries} - {None}
+    for entry, found in zip(entries, refs):
+        if entry["table"]:
+            found.add(entry["table"])
+        found.discard(dependable_key(entry))
+        if entry["type"] == "TABLE":
+            found.discard(entry["table"])
+        entry["dependencies"] = sorted(found & known)
+
+    st = os.stat(dump_path) if dump_path != "-" else None
+    return {"version": CATALOG_VERSION, "dump": dump_path,
+            "size": st.st_size if st else None, "mtime_ns": st.st_mtime_ns if st else None,
+            "objects": entries}
+
+def load_catalog(dump_path, rebuild=False):
+    # The saved catalog of dump_path, rebuilt when missing or out of date
+    path = catalog_path(dump_path)
+    st = os.stat(dump_path)
+    if not rebuild:
+        try:
+            with open(path, 'r') as f:
+                catalog = json.load(f)
+            if (catalog.get("version") == CATALOG_VERSION and catalog["size"] == st.st_size
+                    and catalog["mtime_ns"] == st.st_mtime_ns):
+                return catalog
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+    catalog = build_catalog(dump_path)
+    os.makedirs(CATALOG_DIR, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(catalog, f, indent=1)
+    return catalog
+
+def matches(value, pattern):
+    # Glob match against a qualified name or just its last part
+    if value is None:
+        return False
+    return fnmatch.fnmatchcase(value, pattern) or fnmatch.fnmatchcase(value.split(".")[-1], pattern)
+
+def select(objects, types=None, schema=None, name=None, table=None, with_dependencies=False):
+    # Catalog entries passing every given filter, in dump order
+    types = {t.upper() for t in types} if types else None
+    chosen = [entry for entry in objects
+              if (types is None or entry["type"] in types)
+              and (schema is None or entry["schema"] == schema)
+              and (name is None or matches(entry["name"], name))
+              and (table is None or matches(entry["table"], table))]
+    if with_dependencies:
+        by_key = {}
+        for entry in objects:
+            key = dependable_key(entry)
+            if key:
+                by_key.setdefault(key, []).append(entry)
+        seen = {id(entry) for entry in chosen}
+        stack = list(chosen)
+        while stack:
+            for key in stack.pop()["dependencies"]:
+                for entry in by_key.get(key, ()):
+                    if id(entry) not in seen:
+                        seen.add(id(entry))
+                        chosen.append(entry)
+                        stack.append(entry)
+    return sorted(chosen, key=lambda entry: entry["offset"])
+
+def extract(dump_path, entries, out):
+    # Copies each entry's bytes from the dump, seeking past everything else
+    with open(dump_path, 'rb') as src:
+        for entry in entries:
+            src.seek(entry["offset"])
+            out.write(src.read(entry["length"]))
+            out.write(b"\n")
+
+def describe(entry):
+    name = entry["name"] if entry["schema"] is None else f"{entry['schema']}.{entry['name']}"
+    on = f" on {entry['table']}" if entry["table"] and entry["table"] != name else ""
+    return f"{entry['type']} {name}{on}"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Index a pg_dump file by object and extract objects from it.")
+    parser.add_argument("dump", help="Uncompressed dump to index")
+    parser.add_argument("--type", action="append", help="Object type, e.g. table, index, policy; repeatable")
+    parser.add_argument("--schema", help="Schema name")
+    parser.add_argument("--name", help="Object name (glob)")
+    parser.add_argument("--table", help="Table the objects belong to (glob), including the table itself")
+    parser.add_argument("--with-dependencies", action="store_true",
+                        help="Also extract the tables, types and functions the objects depend on")
+    parser.add_argument("--list", action="store_true", help="List the matching objects instead of their SQL")
+    parser.add_argument("--output", "-o", help="Write the extracted SQL here instead of stdout")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the catalog even if it is up to date")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if not is_mappable(args.dump):
+        raise SystemExit(f"{args.dump}: the catalog needs an uncompressed dump file")
+    catalog = load_catalog(args.dump, args.rebuild)
+    objects = catalog["objects"]
+    if not (args.type or args.schema or args.name or args.table):
+        for object_type, count in sorted(Counter(entry["type"] for entry in objects).items()):
+            print(f"  {object_type}: {count}")
+        print(f"Catalog of {len(objects)} objects written to {catalog_path(args.dump)}")
+        return
+
+    chosen = select(objects, args.type, args.schema, args.name, args.table, args.with_dependencies)
+    if args.list:
+        for entry in chosen:
+            print(f"  {describe(entry)}  (offset {entry['offset']}, {entry['length']} bytes)")
+        print(f"{len(chosen)} objects")
+    elif args.output:
+        with open(args.output, 'wb') as out:
+            extract(args.dump, chosen, out)
+        print(f"{len(chosen)} objects written to {args.output}")
+    else:
+        extract(args.dump, chosen, sys.stdout.buffer)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import argparse
+import hashlib
+import json
+import re
+import sys
+from collections import Counter
+
+from dump_catalog import describe, identify, normalize
+from dump_io import DumpInput
+
+# Statement-level diff of two pg_dump files. Each statement is keyed by the
+# object it defines (dump_catalog.identify) and hashed in a normalized form,
+# so reordering, whitespace and CREATE OR REPLACE / IF NOT EXISTS noise
+# don't show up; one pass over each dump, linear in their size.
+#
+# Usage:
+#   python scripts/dump_diff.py clean_schema_v6.sql clean_schema_final.sql
+#   python scripts/dump_diff.py old.sql new.sql --migration supabase/migrations/<ts>_sync.sql
+#   python scripts/dump_diff.py old.sql.gz new.sql.gz --json
+
+# Objects a migration can redefine in place
+REPLACEABLE_TYPES = {"FUNCTION", "PROCEDURE", "VIEW"}
+# Objects a migration can drop and recreate without losing data
+RECREATABLE_TYPES = {"INDEX", "POLICY", "TRIGGER", "CONSTRAINT", "RULE"}
+
+CREATE_OR_REPLACE_RE = re.compile(r"^CREATE OR REPLACE ", re.IGNORECASE)
+PLAIN_CREATE_RE = re.compile(r"^CREATE (?!OR REPLACE )", re.IGNORECASE)
+IF_EXISTS_RE = re.compile(r"^((?:CREATE|ALTER|DROP) (?:[A-Z]+ ){1,3}?)IF (?:NOT )?EXISTS ", re.IGNORECASE)
+ARGUMENT_DEFAULT_RE = re.compile(r"\s+(?:DEFAULT|=)\s+[^,]*?(?=,|\)$)", re.IGNORECASE)
+GRANT_RE = re.compile(r"^GRANT (.*) TO (.*?)(?: WITH GRANT OPTION)?$", re.IGNORECASE | re.DOTALL)
+
+class DumpObject:
+    # One object of a dump: its identity, a digest of its normalized SQL,
+    # the SQL itself (None for table data, which is only hashed) and its
+    # position in the dump
+    __slots__ = ("identity", "digest", "body", "position")
+
+    def __init__(self, identity, digest, body, position):
+        self.identity = identity
+        self.digest = digest
+        self.body = body
+        self.position = position
+
+    def entry(self):
+        object_type, schema, name, table, detail = self.identity
+        return {"type": object_type, "schema": schema, "name": name, "table": table, "detail": detail}
+
+def canonical(text):
+    text = CREATE_OR_REPLACE_RE.sub("CREATE ", normalize(text))
+    return IF_EXISTS_RE.sub(r"\1", text, count=1)
+
+def digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def load_objects(path):
+    # {(identity, n): DumpObject} for one dump; n numbers repeats of the same
+    # identity (e.g. identical GRANTs) so none of them is lost
+    objects = {}
+    seen = Counter()
+    data = None  # (DumpObject, running hash) while inside COPY data
+    with DumpInput(path) as statements:
+        for statement in statements:
+            if statement.kind == "COPY DATA":
+                if data is not None:
+                    data[1].update(statement.raw)
+                continue
+            identity = identify(statement)
+            if identity is None:
+                continue
+            if data is not None:
+                data[0].digest = data[1].hexdigest()
+                data = None
+            seen[identity] += 1
+            position = len(objects)
+            if identity[0] == "TABLE DATA":
+                obj = DumpObject(identity, None, None, position)
+                data = (obj, hashlib.blake2b(digest_size=16))
+            else:
+                body = statement.text().rstrip()
+                obj = DumpObject(identity, digest(canonical(body).encode()), body, position)
+            objects[(identity, seen[identity])] = obj
+    if data is not None:
+        data[0].digest = data[1].hexdigest()
+    return objects
+
+def diff_dumps(old_path, new_path):
+    # (added, removed, changed) DumpObjects; changed holds (old, new) pairs
+    old = load_objects(old_path)
+    new = load_objects(new_path)
+    added = [obj for key, obj in new.items() if key not in old]
+    removed = [obj for key, obj in old.items() if key not in new]
+    changed = [(old[key], obj) for key, obj in new.items() if key in old and old[key].digest != obj.digest]
+    return added, removed, changed
+
+def terminated(body):
+    return body if body.endswith(";") else body + ";"
+
+def quote_name(qualified):
+    # "public.users" -> '"public"."users"'; a routine keeps its argument list
+    # (without defaults, which DROP doesn't accept)
+    base, paren, args = qualified.partition("(")
+    quoted = ".".join('"' + part.replace('"', '""') + '"' for part in base.split("."))
+    return quoted + (ARGUMENT_DEFAULT_RE.sub("", paren + args) if paren else "")
+
+def drop_statement(obj):
+    # SQL undoing a removed object, or None when there is no safe general form
+    object_type, schema, name, table, detail = obj.identity
+    qualified = quote_name(name if schema is None else f"{schema}.{name}")
+    name = quote_name(name)
+    table = table and quote_name(table)
+    if object_type in ("TABLE", "VIEW", "MATERIALIZED VIEW", "TYPE", "DOMAIN", "SEQUENCE", "FUNCTION",
+                       "PROCEDURE", "INDEX"):
+        return f"DROP {object_type} IF EXISTS {qualified};"
+    if object_type == "EXTENSION":
+        return f"DROP EXTENSION IF EXISTS {name};"
+    if object_type in ("POLICY", "TRIGGER", "RULE"):
+        return f"DROP {object_type} IF EXISTS {name} ON {table};"
+    if object_type == "CONSTRAINT":
+        return f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name};"
+    if object_type == "GRANT":
+        m = GRANT_RE.match(detail or "")
+        if m:
+            return f"REVOKE {m.group(1)} FROM {m.group(2)};"
+    return None
+
+def commented(body):
+    return "\n".join(f"-- {line}" for line in body.splitlines())
+
+def migration_sql(added, removed, changed):
+    # Migration-shaped SQL for the deltas: drops in reverse dump order, then
+    # new and changed objects in the new dump's order (pg_dump's dependency
+    # order). Anything that can't be applied safely is left as a comment.
+    lines = []
+    for obj in sorted(removed, key=lambda o: o.position, reverse=True):
+        drop = drop_statement(obj)
+        lines.append(drop if drop else f"-- Removed {describe(obj.entry())}: drop it by hand")
+    pending = [(obj.position, None, obj) for obj in added] + [(new.position, old, new) for old, new in changed]
+    for _, old, obj in sorted(pending, key=lambda item: item[0]):
+        entry = obj.entry()
+        if obj.body is None:
+            lines.append(f"-- Table data of {entry['table']} {'differs' if old else 'is new'}; not migrated")
+        elif old is None:
+            lines.append(terminated(obj.body))
+        elif entry["type"] in REPLACEABLE_TYPES:
+            lines.append(terminated(PLAIN_CREATE_RE.sub("CREATE OR REPLACE ", obj.body, count=1)))
+        elif entry["type"] in RECREATABLE_TYPES and drop_statement(old):
+            lines.append(drop_statement(old))
+            lines.append(terminated(obj.body))
+        else:
+            lines.append(f"-- Changed {describe(entry)}: needs a hand-written migration. New definition:")
+            lines.append(commented(terminated(obj.body)))
+    return "\n\n".join(lines) + "\n" if lines else ""
+
+def report(added, removed, changed, file=None):
+    for label, objects in (("Added", added), ("Removed", removed), ("Changed", [new for _, new in changed])):
+        print(f"{label}: {len(objects)}", file=file)
+        for obj in objects:
+            print(f"  {describe(obj.entry())}", file=file)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare two pg_dump files object by object.")
+    parser.add_argument("old", help="Older dump (plain, gzip or zstd)")
+    parser.add_argument("new", help="Newer dump (plain, gzip or zstd)")
+    parser.add_argument("--json", action="store_true", help="Print the differences as JSON")
+    parser.add_argument("--migration", metavar="FILE", help="Write SQL applying the differences to FILE")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    added, removed, changed = diff_dumps(args.old, args.new)
+    if args.json:
+        json.dump({"added": [obj.entry() for obj in added],
+                   "removed": [obj.entry() for obj in removed],
+                   "changed": [new.entry() for _, new in changed]}, sys.stdout, indent=1)
+        print()
+    else:
+        report(added, removed, changed)
+    if args.migration:
+        with open(args.migration, 'w') as f:
+            f.write(migration_sql(added, removed, changed))
+        print(f"Migration written to {args.migration}", file=sys.stderr if args.json else sys.stdout)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import gzip
+import mmap
+import os
+import sys
+
+from sql_dump import CHUNK_SIZE, iter_buffer, iter_statements
+
+# zstandard is only needed for .zst dumps
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Opening and writing dumps for the cleaning tools. "-" is stdin/stdout,
+# so they work in a pipeline:
+#   pg_dump ... | python scripts/clean_dump.py - - | psql ...
+# Input compression is detected from the first bytes, output compression
+# from the file extension (or --compress for stdout). Plain input files are
+# mmap'd and scanned in place; everything else is streamed chunk by chunk.
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+COMPRESSIONS = ["none", "gzip", "zstd"]
+
+def require_zstandard():
+    if zstandard is None:
+        raise RuntimeError("zstd dumps need zstandard: pip install zstandard")
+
+def output_compression(path):
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return "none"
+
+def is_mappable(path):
+    # True for a plain, non-empty regular file (what --workers and mmap need)
+    if path == "-":
+        return False
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if not os.path.isfile(path) or st.st_size == 0:
+        return False
+    with open(path, "rb") as f:
+        head = f.read(4)
+    return not (head.startswith(GZIP_MAGIC) or head.startswith(ZSTD_MAGIC))
+
+class DumpInput:
+    # Context manager over a dump's statements:
+    #   with DumpInput(path) as statements: ...
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.closers = []
+
+    def __enter__(self):
+        if is_mappable(self.path):
+            f = open(self.path, "rb")
+            self.closers.append(f)
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.closers.insert(0, buffer)
+            return iter_buffer(buffer, chunk_size=self.chunk_size)
+        if self.path == "-":
+            f = sys.stdin.buffer
+        else:
+            f = open(self.path, "rb")
+            self.closers.append(f)
+        head = f.peek(4)[:4]
+        if head.startswith(GZIP_MAGIC):
+            f = gzip.GzipFile(fileobj=f, mode="rb")
+            self.closers.insert(0, f)
+        elif head.startswith(ZSTD_MAGIC):
+            require_zstandard()
+            f = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True, closefd=False)
+            self.closers.insert(0, f)
+        return iter_statements(f, self.chunk_size)
+
+    def __exit__(self, *exc):
+        for closer in self.closers:
+            closer.close()
+        self.closers = []
+
+class DumpOutput:
+    # Context manager over a binary writer for path ("-" for stdout):
+    #   with DumpOutput(path) as out: out.write(...)
+    def __init__(self, path, compression=None):
+        self.path = path
+        self.compression = compression or output_compression(path)
+        self.closers = []
+
+    def __enter__(self):
+        if self.path == "-":
+            f = sys.stdout.buffer
+        else:
+            f = open(self.path, "wb")
+            self.closers.append(f)
+        if self.compression == "gzip":
+            # mtime=0 keeps the output the same for the same input
+            f = gzip.GzipFile(fileobj=f, mode="wb", compresslevel=GZIP_LEVEL, mtime=0)
+            self.closers.insert(0, f)
+        elif self.compression == "zstd":
+            require_zstandard()
+            f = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(f, closefd=False)
+            self.closers.insert(0, f)
+        return f
+
+    def __exit__(self, *exc):
+        for closer in self.closers:
+            closer.close()
+        self.closers = []
+        if self.path == "-":
+            sys.stdout.buffer.flush()
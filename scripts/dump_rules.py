@@ -0,0 +1,90 @@
+import re
+
+from sql_dump import OBJECT_TYPES
+
+# Declarative cleaning rules for dump statements (see clean_dump.py).
+#
+# Each rule is a regex over a statement's signature, "KIND\t<body head>",
+# and an action: "drop" removes the statement, "split" cuts hanging ALTER
+# TABLE headers off its front. All enabled rules are compiled into one
+# pattern of optional lookaheads, (?=(?P<rule>...))? per rule, so a single
+# match at position 0 tells which rules apply. Adding a rule adds an
+# alternative to that pattern, not another pass over the dump.
+
+# Bytes of a statement body the rules look at; owner, SET and GRANT
+# statements are short, and function bodies never need to be read in full
+HEAD_BYTES = 4096
+
+# Roles a Supabase project always has; grants to anything else fail on
+# restore into a project that doesn't have the role
+KNOWN_ROLES = ["postgres", "anon", "authenticated", "service_role", "supabase_admin",
+               "supabase_auth_admin", "supabase_storage_admin", "dashboard_user", "pgbouncer",
+               "authenticator", "public"]
+
+NAME = r'(?:"[^"]+"|\w+)'
+# "ALTER TABLE [ONLY] name" alone on its line, and the blank or comment
+# lines that may follow it; clean_dump.split_hanging_alter uses them too
+HANGING_ALTER_HEADER = rf"ALTER TABLE (?:ONLY )?{NAME}(?:\.{NAME})?[ \t]*\r?\n"
+BLANK_OR_COMMENT_LINES = r"(?:[ \t]*(?:--[^\n]*)?\r?\n)*"
+
+# Start of a new top-level command. Anything else after an ALTER TABLE
+# header continues it, even at column 0 (hand-written migrations often put
+# ADD COLUMN, ALTER COLUMN, ENABLE ..., SET SCHEMA on the next line), so
+# ALTER / DROP only start a command with an object type other than COLUMN
+# or CONSTRAINT, and SET / RESET only in their session-setting forms.
+COMMAND_OBJECT_TYPES = "|".join(r"\s+".join(t.split()) for t in OBJECT_TYPES if t not in ("COLUMN", "CONSTRAINT"))
+TOP_LEVEL_COMMAND = (r"(?:(?:CREATE|GRANT|REVOKE|COMMENT|COPY|SELECT|INSERT|UPDATE|DELETE|WITH|DO|BEGIN|COMMIT"
+                     r"|ROLLBACK|END|TRUNCATE|VACUUM|ANALYZE|REFRESH|SECURITY|LOCK|IMPORT)\b"
+                     rf"|(?:ALTER|DROP)\s+(?:{COMMAND_OBJECT_TYPES}|OWNED)\s"
+                     r"|SET\s+(?:SESSION|LOCAL|ROLE|TIME\s+ZONE|CONSTRAINTS|TRANSACTION|[\w.]+\s*(?:=|TO\b))"
+                     r"|RESET\s+(?!\()|\\)")
+# A header whose action was lost: only blank or comment lines, then a new
+# command or the end of the statement, follow it
+HANGING_ALTER = rf"{HANGING_ALTER_HEADER}(?={BLANK_OR_COMMENT_LINES}(?:\Z|{TOP_LEVEL_COMMAND}))"
+
+RULES = {
+    # ALTER <object> ... OWNER TO role, or an OWNER TO line whose ALTER was lost
+    "drop-owner": ("drop", r"(?:ALTER [A-Z ]+\t[^;]*?\bOWNER\s+TO\b|OWNER TO\t)"),
+    "drop-set": ("drop", r"SET\t"),
+    # A header line naming only a table, followed by a new command rather
+    # than an action (see HANGING_ALTER)
+    "drop-hanging-alter": ("split", rf"ALTER TABLE\t{HANGING_ALTER}"),
+    # GRANT ... TO / REVOKE ... FROM a list naming at least one unknown role
+    "drop-grants-to-missing-roles": ("drop", r"(?:GRANT|REVOKE)\t[^;]*?\b(?:TO|FROM)\s+"
+                                             r'(?:"?\w+"?\s*,\s*)*"?(?!(?:{roles})"?(?:\s|,|;|$))\w+'),
+    # Need ownership of objects Supabase manages itself
+    "drop-default-privileges": ("drop", r"ALTER DEFAULT PRIVILEGES\t"),
+    "drop-extension-comments": ("drop", r"COMMENT ON EXTENSION\t"),
+    "drop-publication": ("drop", r"(?:CREATE|ALTER) PUBLICATION\t"),
+}
+
+class RuleSet:
+    # The enabled rules compiled into one matcher, with a hit counter per rule
+
+    def __init__(self, names, roles=KNOWN_ROLES):
+        unknown = [name for name in names if name not in RULES]
+        if unknown:
+            raise ValueError(f"Unknown cleaning rules: {', '.join(unknown)}")
+        self.names = list(dict.fromkeys(names))
+        self.groups = {f"r{i}": name for i, name in enumerate(self.names)}
+        roles_pattern = "|".join(re.escape(role) for role in roles)
+        pattern = "".join(
+            f"(?=(?P<r{i}>{RULES[name][1].replace('{roles}', roles_pattern)}))?"
+            for i, name in enumerate(self.names)
+        )
+        self.matcher = re.compile(pattern, re.IGNORECASE | re.DOTALL)
+        self.counts = {name: 0 for name in self.names}
+
+    def match(self, statement):
+        # (rule name, action) of the first enabled rule that matches, or None
+        if not statement.kind or statement.kind == "COPY DATA":
+            return None  # table data passes through unread
+        m = self.matcher.match(f"{statement.kind}\t{statement.text(HEAD_BYTES)}")
+        for group, value in m.groupdict().items():
+            if value is not None:
+                name = self.groups[group]
+                return name, RULES[name][0]
+        return None
+
+    def hit(self, name, count=1):
+        self.counts[name] += count
@@ -1,26 +1,14 @@
-import re
+from clean_dump import clean_dump, print_counts
 
 INPUT_FILE = "supabase/migrations/20260203154500_init_from_prod.sql"
 OUTPUT_FILE = "supabase/migrations/clean_schema_v4.sql"
 
 def minimal_clean(input_path, output_path):
-    with open(input_path, 'r') as f:
-        lines = f.readlines()
-
-    cleaned_lines = []
-    for line in lines:
-        # ONLY remove ALTER OWNER. 
-        # These are strictly permission/role assignments that fail if the user isn't superuser 
-        # or if the roles match strictly.
-        if line.strip().startswith("ALTER OWNER"):
-            continue
-            
-        # Keep everything else, including "SET" (which broke previous logic)
-        cleaned_lines.append(line)
-
-    with open(output_path, 'w') as f:
-        f.writelines(cleaned_lines)
-    
+    # ONLY remove ALTER ... OWNER TO.
+    # These are strictly permission/role assignments that fail if the user isn't superuser
+    # or if the roles match strictly. Everything else is kept, including "SET".
+    counts = clean_dump(input_path, output_path, rules=["drop-owner"])
+    print_counts(counts)
     print(f"Minimal clean SQL written to {output_path}")
 
 if __name__ == "__main__":
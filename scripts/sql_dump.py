@@ -0,0 +1,381 @@
+import re
+
+# Streaming statement tokenizer for pg_dump output.
+#
+# iter_statements(f) reads a binary file object chunk by chunk and yields
+# Statement objects. Each one carries the exact bytes of the dump from the
+# end of the previous statement up to and including its terminating ";" (so
+# the comments and blank lines in front of a statement travel with it), and
+# writing every Statement.raw back out reproduces the input byte for byte.
+# The rest of the line after the ";" (spaces, a trailing comment, the line
+# break) belongs to the statement too, so dropping one removes whole lines.
+#
+# Semicolons only end a statement outside of string literals ('...' and
+# E'...'), quoted identifiers, dollar-quoted bodies ($$...$$, $tag$...$tag$),
+# -- comments and nested /* */ comments. psql meta-commands (\connect,
+# \restrict) are one line each, and the data lines after COPY ... FROM stdin
+# are yielded as "COPY DATA" statements up to the \. terminator. COPY data
+# is found with one search for the terminator per read, never line by line,
+# so data-heavy dumps pass through at close to disk speed.
+#
+# Memory is bounded by the read chunk size plus the longest single statement.
+# iter_buffer() scans a buffer that is already addressable (an mmap'd file)
+# in place instead; only the statements themselves are copied out.
+
+CHUNK_SIZE = 1024 * 1024
+
+# Bytes that may change the scanner state inside a statement
+SPECIAL_RE = re.compile(rb"""[;'"$]|--|/\*""")
+WHITESPACE_RE = re.compile(rb"[ \t\r\n\f\v]*")
+# The rest of the line after a statement's ";" stays with the statement
+LINE_REST_RE = re.compile(rb"[ \t]*(?:--[^\n]*)?(?:\r?\n)?")
+# The "\." line that ends COPY data, after a data line or at a piece's start
+COPY_END_RE = re.compile(rb"\n\\\.(?:\r?\n|\Z)")
+COPY_END_AT_START_RE = re.compile(rb"\\\.(?:\r?\n|\Z)")
+COMMENT_DELIMITER_RE = re.compile(rb"/\*|\*/")
+E_STRING_RE = re.compile(rb"[\\']")
+DOLLAR_TAG_RE = re.compile(rb"\$(?:[A-Za-z_\x80-\xff][A-Za-z0-9_\x80-\xff]*)?\$")
+IDENT_BYTES = frozenset(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_$")
+
+# Look-ahead kept available when a token starts, so short lookups
+# (dollar tags, doubled quotes, the COPY terminator) never straddle a chunk
+LOOKAHEAD = 256
+
+# Words of a statement head: quoted identifiers, plain words, single symbols
+WORD_RE = re.compile(r'"(?:[^"]|"")*"|[A-Za-z_][A-Za-z0-9_$]*|\S')
+
+# Object types after CREATE / ALTER / DROP / COMMENT ON, longest first
+OBJECT_TYPES = [
+    "FOREIGN DATA WRAPPER", "TEXT SEARCH CONFIGURATION", "TEXT SEARCH DICTIONARY",
+    "MATERIALIZED VIEW", "FOREIGN TABLE", "EVENT TRIGGER", "DEFAULT PRIVILEGES",
+    "ACCESS METHOD", "CONSTRAINT TRIGGER", "OPERATOR CLASS", "OPERATOR FAMILY",
+    "AGGREGATE", "CAST", "COLLATION", "COLUMN", "CONSTRAINT", "CONVERSION", "DATABASE",
+    "DOMAIN", "EXTENSION", "FUNCTION", "INDEX", "LANGUAGE", "OPERATOR", "POLICY",
+    "PROCEDURE", "PUBLICATION", "ROLE", "ROUTINE", "RULE", "SCHEMA", "SEQUENCE", "SERVER",
+    "STATISTICS", "SUBSCRIPTION", "TABLE", "TABLESPACE", "TRIGGER", "TYPE", "USER", "VIEW",
+]
+# Words that can sit between the verb and the object type
+CREATE_MODIFIERS = {"OR", "REPLACE", "UNIQUE", "TEMP", "TEMPORARY", "UNLOGGED", "GLOBAL", "LOCAL",
+                    "TRUSTED", "PROCEDURAL", "RECURSIVE"}
+# Words that can sit between the object type and its name
+NAME_PREFIXES = {"IF", "NOT", "EXISTS", "ONLY", "CONCURRENTLY"}
+
+class Statement:
+    # raw: bytes from the end of the previous statement through this one;
+    # offset: byte position of raw in the dump; body_start: index in raw of
+    # the first significant byte (after leading whitespace and comments).
+    # kind is e.g. "CREATE TABLE", "ALTER FUNCTION", "SET", "COPY DATA" or ""
+    # for trailing whitespace/comments; target the object it names
+    # ("public.users"), when there is one.
+    __slots__ = ("raw", "offset", "body_start", "kind", "target")
+
+    def __init__(self, raw, offset, body_start, kind, target=None):
+        self.raw = raw
+        self.offset = offset
+        self.body_start = body_start
+        self.kind = kind
+        self.target = target
+
+    @property
+    def body(self):
+        return self.raw[self.body_start:]
+
+    def text(self, limit=None):
+        # Decoded body (or its first `limit` bytes) for rule matching
+        body = self.raw[self.body_start:] if limit is None else self.raw[self.body_start:self.body_start + limit]
+        return body.decode("utf-8", "replace")
+
+    def __repr__(self):
+        return f"Statement({self.kind!r}, {self.target!r}, offset={self.offset}, length={len(self.raw)})"
+
+def unquote(word):
+    if word.startswith('"'):
+        return word[1:-1].replace('""', '"')
+    return word.lower()
+
+def read_name(words, i):
+    # Qualified name starting at words[i]; returns (name, next index)
+    if i >= len(words) or not (words[i][0].isalpha() or words[i][0] in '_"'):
+        return None, i
+    parts = [unquote(words[i])]
+    i += 1
+    while i + 1 < len(words) and words[i] == ".":
+        parts.append(unquote(words[i + 1]))
+        i += 2
+    return ".".join(parts), i
+
+def parse_head(text):
+    # (kind, target) from the start of a statement body
+    words = WORD_RE.findall(text)
+    if not words:
+        return "", None
+    upper = [w.upper() for w in words[:8]]
+    verb = upper[0]
+    if verb == "COMMENT" and len(upper) > 1 and upper[1] == "ON":
+        verb, rest = "COMMENT ON", 2
+    elif verb == "OWNER" and len(upper) > 1 and upper[1] == "TO":
+        return "OWNER TO", None
+    else:
+        rest = 1
+    if verb in ("CREATE", "ALTER", "DROP", "COMMENT ON"):
+        i = rest
+        while i < len(upper) and upper[i] in CREATE_MODIFIERS:
+            i += 1
+        for object_type in OBJECT_TYPES:
+            type_words = object_type.split()
+            if upper[i:i + len(type_words)] == type_words:
+                i += len(type_words)
+                while i < len(words) and words[i].upper() in NAME_PREFIXES:
+                    i += 1
+                name, _ = read_name(words, i)
+                return f"{verb} {object_type}", name
+        return verb, None
+    if verb in ("SET", "RESET"):
+        return verb, words[1].lower() if len(words) > 1 else None
+    if verb == "COPY":
+        name, _ = read_name(words, 1)
+        return verb, name
+    if verb in ("GRANT", "REVOKE"):
+        upper_all = [w.upper() for w in words]
+        if "ON" in upper_all:
+            i = upper_all.index("ON") + 1
+            while i < len(words) and upper_all[i] in ("TABLE", "SEQUENCE", "FUNCTION", "SCHEMA", "TYPE",
+                                                      "DOMAIN", "PROCEDURE", "ROUTINE", "ALL", "TABLES",
+                                                      "SEQUENCES", "FUNCTIONS", "IN", "LANGUAGE",
+                                                      "DATABASE", "FOREIGN", "SERVER"):
+                i += 1
+            name, _ = read_name(words, i)
+            return verb, name
+        return verb, None
+    return verb, None
+
+class StatementReader:
+    # Iterator over the statements of a binary stream (see module comment)
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE, offset=0):
+        # offset: dump position of f's current position, for readers that
+        # start part-way through a dump
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = b""
+        self.start = 0      # index in buf where the next statement begins
+        self.offset = offset  # dump offset of buf[0]
+        self.eof = False
+        self.copy_target = None  # set while inside a COPY ... FROM stdin data block
+
+    def __iter__(self):
+        return self
+
+    def _fill(self):
+        # Appends the next chunk; False at end of input
+        if self.eof:
+            return False
+        data = self.f.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf += data
+        return True
+
+    def _ensure(self, i, n=LOOKAHEAD):
+        # Makes buf[i:i+n] available unless the input ends first
+        while len(self.buf) - i < n and self._fill():
+            pass
+
+    def _take(self, end, body_start, kind, target):
+        raw = self.buf[self.start:end]
+        statement = Statement(raw, self.offset + self.start, body_start - self.start, kind, target)
+        self.start = end
+        return statement
+
+    def __next__(self):
+        if self.f is not None and self.start >= self.chunk_size:
+            # Drop consumed bytes once they are worth a copy
+            self.offset += self.start
+            self.buf = self.buf[self.start:]
+            self.start = 0
+        if self.copy_target is not None:
+            return self._copy_data()
+        body = self._skip_trivia(self.start)
+        if body >= len(self.buf):
+            if self.start >= len(self.buf):
+                raise StopIteration
+            return self._take(len(self.buf), len(self.buf), "", None)
+
+        if self.buf[body] == ord("\\"):
+            # psql meta-command: runs to the end of its line
+            end = self._line_end(body)
+            return self._take(end, body, "META", None)
+
+        end = self._scan(body)
+        self._ensure(end)
+        end = LINE_REST_RE.match(self.buf, end).end()
+        self._ensure(body, LOOKAHEAD)
+        kind, target = parse_head(self.buf[body:min(end, body + LOOKAHEAD)].decode("utf-8", "replace"))
+        if kind == "COPY" and re.search(rb"\bFROM\s+stdin\b", self.buf[body:end], re.IGNORECASE):
+            # The data starts on the next line
+            self.copy_target = target or ""
+        return self._take(end, body, kind, target)
+
+    def _line_end(self, i):
+        # Index just past the newline that ends the line containing buf[i]
+        while True:
+            nl = self.buf.find(b"\n", i)
+            if nl >= 0:
+                return nl + 1
+            i = len(self.buf)
+            if not self._fill():
+                return len(self.buf)
+
+    def _copy_data(self):
+        # Data lines up to and including the "\." line, yielded in line-aligned
+        # pieces of about chunk_size so a huge table never sits in memory at once
+        target = self.copy_target
+        start = self.start
+        self._ensure(start, 4)
+        m = COPY_END_AT_START_RE.match(self.buf, start)
+        if m:
+            # An empty block, or the previous piece stopped just before the end
+            self.copy_target = None
+            return self._take(m.end(), start, "COPY DATA", target)
+        i = start
+        while True:
+            limit = min(len(self.buf), start + self.chunk_size)
+            # \Z only means the end of the data once the input has ended
+            m = COPY_END_RE.search(self.buf, max(start, i - 4), limit)
+            if m and (m.group().endswith(b"\n") or (limit == len(self.buf) and self.eof)):
+                self.copy_target = None
+                return self._take(m.end(), start, "COPY DATA", target)
+            if limit - start >= self.chunk_size:
+                cut = self.buf.rfind(b"\n", start, limit)
+                # A single line longer than a piece runs on to its end
+                end = cut + 1 if cut >= 0 else self._line_end(limit)
+                return self._take(end, start, "COPY DATA", target)
+            if limit == len(self.buf) and not self._fill():
+                self.copy_target = None  # input ended inside the block
+                return self._take(len(self.buf), start, "COPY DATA", target)
+            i = limit
+
+    def _skip_trivia(self, i):
+        # Skips whitespace and comments; returns the first significant index
+        while True:
+            i = WHITESPACE_RE.match(self.buf, i).end()
+            if i >= len(self.buf):
+                if not self._fill():
+                    return i
+                continue
+            self._ensure(i, 2)
+            head = self.buf[i:i + 2]
+            if head == b"--":
+                i = self._line_end(i)
+            elif head == b"/*":
+                i = self._skip_block_comment(i)
+            else:
+                return i
+
+    def _scan(self, i):
+        # Index just past the ";" that ends the statement starting at i
+        # (or the end of input for an unterminated last statement)
+        while True:
+            m = SPECIAL_RE.search(self.buf, i)
+            if m is None:
+                # Keep the last byte: it may be the first half of -- or /*
+                i = max(i, len(self.buf) - 1)
+                if not self._fill():
+                    return len(self.buf)
+                continue
+            j = m.start()
+            self._ensure(j)
+            c = self.buf[j]
+            if c == 0x3B:  # ;
+                return j + 1
+            if c == 0x27:  # '
+                i = self._skip_string(j)
+            elif c == 0x22:  # "
+                i = self._skip_quoted(j + 1, 0x22)
+            elif c == 0x24:  # $
+                i = self._skip_dollar(j)
+            elif self.buf[j + 1] == 0x2D:  # --
+                i = self._line_end(j)
+            else:
+                i = self._skip_block_comment(j)
+
+    def _skip_quoted(self, i, quote):
+        # Past the closing quote of '...' or "..." (doubled quotes escape)
+        q = bytes([quote])
+        while True:
+            k = self.buf.find(q, i)
+            if k < 0:
+                i = len(self.buf)
+                if not self._fill():
+                    return i
+                continue
+            self._ensure(k, 2)
+            if k + 1 < len(self.buf) and self.buf[k + 1] == quote:
+                i = k + 2
+                continue
+            return k + 1
+
+    def _skip_string(self, j):
+        escaped = j > 0 and self.buf[j - 1] in b"Ee" and (j < 2 or self.buf[j - 2] not in IDENT_BYTES)
+        if not escaped:
+            return self._skip_quoted(j + 1, 0x27)
+        # E'...': backslash escapes as well as doubled quotes
+        i = j + 1
+        while True:
+            m = E_STRING_RE.search(self.buf, i)
+            if m is None:
+                i = len(self.buf)
+                if not self._fill():
+                    return i
+                continue
+            k = m.start()
+            self._ensure(k, 2)
+            if self.buf[k] == 0x5C:  # backslash
+                i = k + 2
+            elif k + 1 < len(self.buf) and self.buf[k + 1] == 0x27:
+                i = k + 2
+            else:
+                return k + 1
+
+    def _skip_dollar(self, j):
+        m = DOLLAR_TAG_RE.match(self.buf, j)
+        if m is None or (j > 0 and self.buf[j - 1] in IDENT_BYTES):
+            return j + 1  # $1 parameter or part of an identifier
+        tag = m.group()
+        i = m.end()
+        while True:
+            k = self.buf.find(tag, i)
+            if k >= 0:
+                return k + len(tag)
+            i = max(i, len(self.buf) - len(tag) + 1)
+            if not self._fill():
+                return len(self.buf)
+
+    def _skip_block_comment(self, j):
+        # Block comments nest in PostgreSQL
+        depth = 0
+        i = j
+        while True:
+            m = COMMENT_DELIMITER_RE.search(self.buf, i)
+            if m is None:
+                i = max(i, len(self.buf) - 1)
+                if not self._fill():
+                    return len(self.buf)
+                continue
+            depth += 1 if m.group() == b"/*" else -1
+            i = m.end()
+            if depth == 0:
+                return i
+
+def iter_statements(f, chunk_size=CHUNK_SIZE, offset=0):
+    return StatementReader(f, chunk_size, offset)
+
+def iter_buffer(buffer, start=0, chunk_size=CHUNK_SIZE):
+    # Statements of a whole dump held in `buffer` (bytes or mmap), from byte
+    # `start`, which must be a statement boundary
+    reader = StatementReader(None, chunk_size)
+    reader.buf = buffer
+    reader.start = start
+    reader.eof = True
+    return reader
@@ -0,0 +1,72 @@
+import json
+import threading
+
+# Upsert batches are sized by serialized bytes, not rows: wide jsonb/text
+# tables hit request size limits at a few hundred rows, while narrow join
+# tables can take many thousands per request.
+BATCH_BYTES = 1024 * 1024
+MIN_BATCH_BYTES = 64 * 1024
+MAX_BATCH_BYTES = 8 * 1024 * 1024
+MAX_BATCH_ROWS = 10000
+
+# Batches slower than this shrink the budget, faster ones grow it
+TARGET_BATCH_SECONDS = 2.0
+
+def row_bytes(row):
+    return len(json.dumps(row, default=str).encode("utf-8"))
+
+class BatchSizer:
+    # Per-table AIMD controller for the batch byte budget: grow by a quarter
+    # after a fast, clean batch; halve after an error or a slow batch.
+    # Thread-safe: concurrent upload workers all report into one sizer.
+
+    def __init__(self, budget=BATCH_BYTES, min_bytes=MIN_BATCH_BYTES, max_bytes=MAX_BATCH_BYTES,
+                 max_rows=MAX_BATCH_ROWS, target_seconds=TARGET_BATCH_SECONDS):
+        self.budget = budget
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.max_rows = max_rows
+        self.target_seconds = target_seconds
+        self.batches = 0
+        self.rows = 0
+        self.bytes = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def record(self, rows, nbytes, seconds, errors=0):
+        with self.lock:
+            self._record(rows, nbytes, seconds, errors)
+
+    def _record(self, rows, nbytes, seconds, errors):
+        self.batches += 1
+        self.rows += rows
+        self.bytes += nbytes
+        self.errors += errors
+        if errors or seconds > 2 * self.target_seconds:
+            self.budget = max(self.min_bytes, self.budget // 2)
+        elif seconds < self.target_seconds:
+            self.budget = min(self.max_bytes, int(self.budget * 1.25))
+
+    def summary(self):
+        if not self.batches:
+            return "no batches"
+        return (f"{self.batches} batches, avg {self.rows // self.batches} rows / "
+                f"{self.bytes // self.batches // 1024} KB per batch, "
+                f"final budget {self.budget // 1024} KB")
+
+def sized_batches(rows, sizer):
+    # Groups a stream of rows into (batch, nbytes) under the sizer's current
+    # budget. The budget is read per batch, so feedback recorded between
+    # batches applies to the next one. A single oversized row is sent alone.
+    batch = []
+    nbytes = 0
+    for row in rows:
+        size = row_bytes(row)
+        if batch and (nbytes + size > sizer.budget or len(batch) >= sizer.max_rows):
+            yield batch, nbytes
+            batch = []
+            nbytes = 0
+        batch.append(row)
+        nbytes += size
+    if batch:
+        yield batch, nbytes
@@ -1,8 +1,26 @@
+import argparse
+import hashlib
+import json
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from functools import partial
+from types import SimpleNamespace
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from sync_batching import BatchSizer, sized_batches
+from sync_journal import Journal
+from sync_profiles import apply_placeholders, load_profiles, select_list
+from sync_metrics import TableMetrics, write_json_report, write_prometheus
+from sync_scheduler import critical_path, pipelined, run_dag
+from sync_transport import Transport, configure_pool
+from sync_snapshot import SnapshotReader, SnapshotWriter
+import sync_pg
+from sync_schema import deferred_foreign_keys, load_schema, primary_key, table_dependencies, tenant_scopes
+
 # Load environment variables
 load_dotenv('.env.local')
 
@@ -14,188 +32,915 @@ DEV_KEY = os.environ.get("DEV_SUPABASE_SERVICE_ROLE_KEY")
 
 DEFAULT_PASSWORD = "dev_password_123"
 
-if not PROD_KEY or not DEV_KEY:
-    print("Error: Missing Service Role Keys in .env.local")
-    exit(1)
+# Direct Postgres connection strings for --backend pg (COPY instead of REST)
+PROD_DB_URL = os.environ.get("PROD_DATABASE_URL")
+DEV_DB_URL = os.environ.get("DEV_DATABASE_URL")
+
+# Request rate limits per target (requests/second). Prod is throttled so a
+# big sync doesn't compete with real users.
+PROD_RPS = 20
+DEV_RPS = 50
+
+# Local, git-ignored working files for the sync (watermarks etc.)
+SYNC_DIR = ".sync"
+STATE_FILE = os.path.join(SYNC_DIR, "state.json")
+REPORT_FILE = os.path.join(SYNC_DIR, "report.json")
+DEAD_LETTER_FILE = os.path.join(SYNC_DIR, "dead_letter.jsonl")
+JOURNAL_FILE = os.path.join(SYNC_DIR, "journal.jsonl")
+
+# Columns used as the delta high-water mark, in order of preference
+DELTA_COLUMNS = ["updated_at", "created_at"]
+
+# Columns --diff leaves out of row digests: dev's BEFORE UPDATE triggers set
+# updated_at = NOW() on every upsert or back-fill, so it never matches prod.
+# A profile's "digest_exclude" replaces this list for its table.
+DIGEST_EXCLUDE = ["updated_at"]
+
+# Auth admin API: page size for listing, concurrent create/update calls
+AUTH_PAGE_SIZE = 1000
+AUTH_WORKERS = 8
 
-def get_clients():
-    prod = create_client(PROD_URL, PROD_KEY)
-    dev = create_client(DEV_URL, DEV_KEY)
+# Public tables copied from prod. The order they run in comes from the
+# foreign keys in the schema dump (see sync_scheduler.run_dag).
+SYNC_TABLES = [
+    "tenants", "neighborhoods", "lots", "family_units", "users",
+    "locations",
+    "announcements", "announcement_reads",
+    "event_categories", "events", "event_rsvps", "event_invites",
+    "check_ins", "check_in_rsvps",
+    "exchange_listings", "exchange_transactions",  # "Posts"
+    "resident_requests", "notifications",
+    "user_privacy_settings", "pets",
+]
+
+# Dependencies that are not foreign keys in the dump.
+# public.users ids are the auth.users ids, so accounts must exist first.
+EXTRA_DEPENDENCIES = {
+    "users": {"auth.users"},
+}
+
+# Tables sync concurrently; keep each log line in one piece
+print_lock = threading.Lock()
+
+def log(message):
+    with print_lock:
+        print(message, flush=True)
+
+def get_clients(need_prod=True, need_dev=True, prod_rps=PROD_RPS, dev_rps=DEV_RPS, pool_size=10):
+    # Snapshot runs only talk to one side, so only that side's key is required.
+    # Each client gets a pooled keep-alive session and a Transport (rate
+    # limit + retry with backoff) that execute() routes its requests through.
+    if (need_prod and not PROD_KEY) or (need_dev and not DEV_KEY):
+        print("Error: Missing Service Role Keys in .env.local")
+        exit(1)
+    prod = dev = None
+    if need_prod:
+        prod = create_client(PROD_URL, PROD_KEY)
+        prod.sync_transport = Transport("prod", rate=prod_rps, burst=2 * prod_rps)
+        configure_pool(prod, pool_size)
+    if need_dev:
+        dev = create_client(DEV_URL, DEV_KEY)
+        dev.sync_transport = Transport("dev", rate=dev_rps, burst=2 * dev_rps)
+        configure_pool(dev, pool_size)
     return prod, dev
 
-def sync_table(prod, dev, table_name, constraint=None, batch_size=1000):
-    print(f"Syncing table: {table_name}...")
-    try:
-        # Fetch data
-        response = prod.table(table_name).select("*").execute()
-        data = response.data
-        
-        if not data:
-            print(f"  No data in {table_name}.")
+def call(client, fn):
+    # Run one API call under the client's Transport, if it has one
+    transport = getattr(client, "sync_transport", None)
+    return transport.call(fn) if transport else fn()
+
+def execute(client, query):
+    return call(client, query.execute)
+
+# Per table: concurrent upsert requests, and upsert batches fetched ahead of
+# them. Memory per table is bounded by about (depth + workers) batches.
+UPLOAD_WORKERS = 2
+UPLOAD_QUEUE_DEPTH = 4
+
+# Values per in.(...) filter; keeps request URLs well under proxy limits
+IN_CHUNK = 200
+
+def fetch_pages(client, table_name, key, page_size=1000, since_column=None, since=None,
+                filters=(), columns="*", after=None):
+    # Keyset pagination: WHERE key > last_key ORDER BY key LIMIT page_size,
+    # key being the table's primary key (sync_schema.primary_key).
+    # PostgREST caps a single response (max-rows), so one select("*") can silently
+    # truncate big tables. Paging by primary key keeps every request small and
+    # only one page is held in memory at a time.
+    #
+    # With since_column/since only rows where since_column >= since are read, and
+    # the keyset becomes (since_column, key) so rows sharing a timestamp are not lost.
+    #
+    # filters are (op, column, value) tuples added to every request, e.g.
+    # ("eq", "tenant_id", id) or ("in", "event_id", ids). Long in-lists are
+    # split into chunks of IN_CHUNK values, each paged on its own.
+    #
+    # after resumes the keyset past a position from keyset_position (a
+    # journal checkpoint); it only applies to a single, unchunked page stream.
+    for i, (op, column, value) in enumerate(filters):
+        if op != "in":
+            continue
+        if not value:
+            return
+        if len(value) > IN_CHUNK:
+            value = sorted(value)
+            for start in range(0, len(value), IN_CHUNK):
+                chunked = list(filters)
+                chunked[i] = ("in", column, value[start:start+IN_CHUNK])
+                yield from fetch_pages(client, table_name, key, page_size, since_column, since,
+                                       chunked, columns)
+            return
+    if isinstance(client, SnapshotReader):
+        yield from client.pages(table_name, page_size=page_size, since_column=since_column, since=since,
+                                filters=filters, columns=columns)
+        return
+    delta = since_column is not None and since is not None
+    last = (tuple(after) if delta else after) if after is not None else None
+    while True:
+        query = client.table(table_name).select(columns)
+        for op, column, value in filters:
+            query = getattr(query, "in_" if op == "in" else op)(column, value)
+        if delta:
+            query = query.order(since_column).order(key)
+            if last is None:
+                query = query.gte(since_column, since)
+            else:
+                ts, last_key = last
+                query = query.or_(
+                    f'{since_column}.gt."{ts}",and({since_column}.eq."{ts}",{key}.gt.{last_key})'
+                )
+        else:
+            query = query.order(key)
+            if last is not None:
+                query = query.gt(key, last)
+        page = execute(client, query.limit(page_size)).data
+        if not page:
             return
+        yield page
+        if len(page) < page_size:
+            return
+        last = (page[-1][since_column], page[-1][key]) if delta else page[-1][key]
+
+def keyset_position(row, key, since_column=None):
+    # Where fetch_pages would continue after this row (see its after argument)
+    return [row[since_column], row[key]] if since_column else row[key]
+
+def scoped_pages(client, table_name, key, scope=None, **kwargs):
+    # fetch_pages over each alternative filter list in scope (see
+    # sync_schema.tenant_scopes), skipping rows an earlier alternative returned
+    if not scope:
+        yield from fetch_pages(client, table_name, key, **kwargs)
+        return
+    seen = set()
+    for filters in scope:
+        for page in fetch_pages(client, table_name, key, filters=filters, **kwargs):
+            if len(scope) > 1:
+                page = [row for row in page if row[key] not in seen]
+                seen.update(row[key] for row in page)
+            if page:
+                yield page
+
+def collect_keys(client, table_name, key, scope=None):
+    return {row[key] for page in scoped_pages(client, table_name, key, scope, columns=key) for row in page}
+
+def state_file(tenant=None):
+    # Tenant-scoped runs keep their own watermarks: advancing the shared ones
+    # after copying a single tenant would make later full deltas skip rows.
+    return os.path.join(SYNC_DIR, f"state.{tenant}.json") if tenant else STATE_FILE
 
-        print(f"  Found {len(data)} rows.")
-        
-        # Insert/Upsert
-        # We handle batches to avoid payload limits
-        for i in range(0, len(data), batch_size):
-            batch = data[i:i+batch_size]
-            try:
-                # Upsert is safer
-                dev.table(table_name).upsert(batch).execute()
-                print(f"  Synced batch {i}-{i+len(batch)}")
-            except Exception as e:
-                print(f"  Error syncing batch in {table_name}: {e}")
-                # Try row by row if batch fails?
-                for row in batch:
-                    try:
-                        dev.table(table_name).upsert(row).execute()
-                    except Exception as inner_e:
-                        print(f"    Failed row {row.get('id')}: {inner_e}")
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_state(state, path=STATE_FILE):
+    os.makedirs(SYNC_DIR, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def delta_column(schema, table_name):
+    columns = schema.get(table_name, {}).get("columns", {})
+    for column in DELTA_COLUMNS:
+        if column in columns:
+            return column
+    return None
 
+dead_letter_lock = threading.Lock()
+
+def dead_letter(table_name, row, error):
+    # One JSON line per rejected row; replay with --replay-dead-letters
+    entry = {
+        "table": table_name,
+        "row": row,
+        "error": str(error),
+        "failed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    with dead_letter_lock:
+        os.makedirs(SYNC_DIR, exist_ok=True)
+        with open(DEAD_LETTER_FILE, 'a') as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+
+def upsert_batch(dev, table_name, key, batch, bisecting=False, stats=None):
+    # A failed batch is split in halves until the bad rows are isolated, so
+    # k bad rows in a batch of n cost O(k log n) requests instead of n.
+    # Rows that fail on their own go to the dead-letter file.
+    # Requests and failed requests are counted in stats when it is given.
+    if stats is not None:
+        stats["requests"] = stats.get("requests", 0) + 1
+    try:
+        # Upsert is safer
+        execute(dev, dev.table(table_name).upsert(batch))
+        return len(batch)
     except Exception as e:
-        print(f"Failed to sync table {table_name}: {e}")
+        if stats is not None:
+            stats["errors"] = stats.get("errors", 0) + 1
+        if len(batch) == 1:
+            log(f"    Failed row {batch[0].get(key)} in {table_name}: {e}")
+            dead_letter(table_name, batch[0], e)
+            return 0
+        if not bisecting:
+            log(f"  Error syncing batch in {table_name}: {e} (bisecting {len(batch)} rows)")
+        mid = len(batch) // 2
+        return (upsert_batch(dev, table_name, key, batch[:mid], bisecting=True, stats=stats)
+                + upsert_batch(dev, table_name, key, batch[mid:], bisecting=True, stats=stats))
+
+def upsert_sized(dev, table_name, key, batch, nbytes, sizer, metrics=None, phase="upsert"):
+    # Upsert one byte-budgeted batch and feed its latency/errors back to the sizer
+    stats = {}
+    start = time.monotonic()
+    synced = upsert_batch(dev, table_name, key, batch, stats=stats)
+    elapsed = time.monotonic() - start
+    sizer.record(len(batch), nbytes, elapsed, stats.get("errors", 0))
+    if metrics is not None:
+        metrics.add_seconds(phase, elapsed)
+        metrics.add("rows_written", synced)
+        metrics.add("failed", len(batch) - synced)
+        metrics.add("bytes_sent", nbytes)
+        metrics.add("batches")
+        metrics.add("requests", stats.get("requests", 0))
+        metrics.add("retries", stats.get("requests", 0) - 1)
+        metrics.add("errors", stats.get("errors", 0))
+        metrics.batch_bytes = sizer.budget
+    return synced
+
+def replay_dead_letters(dev, schema, batch_size=1000):
+    # Retry every dead-lettered row. Rows that still fail are written to a
+    # fresh dead-letter file, so the replay can be repeated.
+    if not os.path.exists(DEAD_LETTER_FILE):
+        log("No dead letters to replay.")
+        return
+    replay_path = DEAD_LETTER_FILE + ".replay"
+    os.replace(DEAD_LETTER_FILE, replay_path)
+
+    rows = {}
+    with open(replay_path, 'r') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                rows.setdefault(entry["table"], []).append(entry["row"])
+
+    # Parents before children, so rows that failed on a missing FK can land
+    ordered = [t for t in SYNC_TABLES if t in rows] + sorted(set(rows) - set(SYNC_TABLES))
+    for table_name in ordered:
+        table_rows = rows[table_name]
+        log(f"Replaying {len(table_rows)} dead-lettered rows in {table_name}...")
+        key = primary_key(schema, table_name)
+        synced = 0
+        for i in range(0, len(table_rows), batch_size):
+            synced += upsert_batch(dev, table_name, key, table_rows[i:i+batch_size])
+        log(f"  {table_name}: {synced} recovered, {len(table_rows) - synced} still failing.")
+    os.remove(replay_path)
+
+def row_digest(row, exclude=()):
+    # Stable content hash: both sides come back from PostgREST as JSON, so the
+    # canonical (sorted-key) serialization matches when the rows are equal.
+    # exclude names trigger-maintained columns that differ by design.
+    if exclude:
+        row = {column: value for column, value in row.items() if column not in exclude}
+    canonical = json.dumps(row, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).digest()
+
+def digest_exclude(profile):
+    if profile is not None and profile.get("digest_exclude") is not None:
+        return set(profile["digest_exclude"])
+    return set(DIGEST_EXCLUDE)
+
+def fetch_digests(client, table_name, key, page_size=1000, scope=None, columns="*", exclude=()):
+    # key -> digest for every row of the table (or of its scope), page by page.
+    # columns must match what is read from prod for the digests to compare.
+    digests = {}
+    for page in scoped_pages(client, table_name, key, scope, page_size=page_size, columns=columns):
+        for row in page:
+            digests[row[key]] = row_digest(row, exclude)
+    return digests
+
+def delete_rows(dev, table_name, key, keys, chunk_size=200):
+    # Bulk delete by primary key; chunks keep the in.(...) filter URL short
+    keys = sorted(keys)
+    deleted = 0
+    for i in range(0, len(keys), chunk_size):
+        chunk = keys[i:i+chunk_size]
+        try:
+            execute(dev, dev.table(table_name).delete().in_(key, chunk))
+            deleted += len(chunk)
+        except Exception as e:
+            log(f"  Error deleting {len(chunk)} rows from {table_name}: {e}")
+    return deleted
+
+def sync_table(prod, dev, table_name, constraint=None, batch_size=1000, schema=None, state=None,
+               deferred_columns=(), diff=False, prune=False, metrics=None, scope=None, journal=None,
+               upload_workers=UPLOAD_WORKERS, profile=None):
+    # When a delta state is passed, only rows changed since the table's stored
+    # watermark are copied and the watermark is advanced afterwards. Tables
+    # without a timestamp column always get a full copy.
+    #
+    # deferred_columns are foreign keys that close a cycle: they are uploaded
+    # as NULL, and the untouched rows that had a value are returned so
+    # backfill_table can restore them once the parents exist.
+    #
+    # With diff, dev's rows are hashed first and only inserted or changed rows
+    # are upserted. prune (implies diff, full syncs only) also deletes dev rows
+    # that no longer exist in prod.
+    #
+    # Timings and counters are recorded in metrics[table_name] (TableMetrics).
+    #
+    # Fetching and upserting overlap: this thread fetches and batches while
+    # upload_workers threads upsert from a bounded queue (sync_scheduler.pipelined).
+    #
+    # profile (see sync_profiles) limits the columns that are read and written
+    # and fills placeholder columns; the diff only compares the read columns.
+    #
+    # scope restricts the sync (and the diff/prune) to a subset of rows, as a
+    # list of alternative filter lists; see scoped_pages.
+    #
+    # With a journal, the keyset position of every committed batch is
+    # checkpointed and a resumed run continues after the last one. Scoped,
+    # pruned and cyclic tables restart from the top instead: their row order
+    # is not one keyset, or they need every row (prune's seen set, the held
+    # back-fill rows).
+    column = delta_column(schema or {}, table_name) if state is not None else None
+    since = state.get(table_name) if column else None
+    mode = f"delta since {since}" if since else "full"
+    log(f"Syncing table: {table_name} ({mode})...")
+    total = 0
+    synced = 0
+    watermark = since
+    held = []
+    sizer = BatchSizer()
+    key = primary_key(schema or {}, table_name)
+    m = TableMetrics(table_name)
+    if metrics is not None:
+        metrics[table_name] = m
+    counts = m.counts
+    counts.update({"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0})
+    diff = diff or prune
+    if prune and since:
+        log(f"  {table_name}: --prune needs a full sync; skipping deletes in delta mode.")
+        prune = False
+    dev_digests = None
+    excluded = digest_exclude(profile)
+    seen = set()
+    columns = select_list(profile, extra=(column,))
+    resumable = (journal is not None and not scope and not prune and not deferred_columns
+                 and not isinstance(prod, SnapshotReader))
+    after = journal.position(table_name) if resumable else None
+    if after is not None:
+        log(f"  {table_name}: resuming after {after}")
+
+    def fetched_rows():
+        pages = scoped_pages(prod, table_name, key, scope, page_size=batch_size, since_column=column, since=since,
+                             after=after, columns=columns)
+        while True:
+            with m.timed("fetch"):
+                page = next(pages, None)
+            if page is None:
+                return
+            with m.timed("transform"):
+                page = transform(page)
+            yield from page
+
+    def transform(page):
+        nonlocal total, watermark
+        total += len(page)
+        m.add("rows_fetched", len(page))
+        m.add("bytes_fetched", len(json.dumps(page, default=str).encode("utf-8")))
+        if column:
+            stamps = [row[column] for row in page if row.get(column)]
+            if stamps:
+                watermark = max([watermark] + stamps) if watermark else max(stamps)
+        if dev_digests is not None:
+            changed = []
+            for row in page:
+                seen.add(row[key])
+                digest = dev_digests.get(row[key])
+                if digest is None:
+                    counts["inserted"] += 1
+                elif digest != row_digest(row, excluded):
+                    counts["updated"] += 1
+                else:
+                    counts["unchanged"] += 1
+                    continue
+                changed.append(row)
+            page = changed
+        page = apply_placeholders(page, profile)
+        if deferred_columns:
+            page, pending = null_deferred_columns(page, deferred_columns)
+            held.extend(pending)
+        return page
 
-def sync_auth_users(prod, dev):
-    print("Syncing Auth Users...")
     try:
-        # List users from Prod (pagination needed if > 50)
-        # For now, simplistic approach
-        users = prod.auth.admin.list_users() 
-        # Note: supbase-py list_users might returns a UserResponse object
-        
-        for user in users:
-            uid = user.id
-            email = user.email
-            meta = user.user_metadata
-            
-            # Check if exists in Dev
-            try:
-                dev.auth.admin.get_user_by_id(uid)
-                # Exists, maybe update? Skipping for now.
-                # print(f"  User {email} exists.")
-            except:
-                # Doesn't exist, create
-                try:
-                    dev.auth.admin.create_user({
-                        "uid": uid,
-                        "email": email,
-                        "password": DEFAULT_PASSWORD,
-                        "email_confirm": True,
-                        "user_metadata": meta
-                    })
-                    print(f"  Created user {email} ({uid})")
-                except Exception as create_e:
-                    print(f"  Failed to create user {email}: {create_e}")
-                    
+        if diff:
+            with m.timed("fetch"):
+                dev_digests = fetch_digests(dev, table_name, key, page_size=batch_size, scope=scope, columns=columns,
+                                            exclude=excluded)
+
+        # Stream pages straight into the upsert step. Upsert batches are cut
+        # by serialized size (see sync_batching), independent of page size.
+        # Batches finish out of order, so the journal checkpoint only moves
+        # past a batch once every batch before it is committed too.
+        done = 0
+        progress = threading.Lock()
+        committed = {}
+        next_checkpoint = 0
+
+        def numbered():
+            nonlocal done
+            for seq, (batch, nbytes) in enumerate(sized_batches(fetched_rows(), sizer)):
+                yield seq, done, batch, nbytes
+                done += len(batch)
+
+        def upload(item):
+            nonlocal synced, next_checkpoint
+            seq, offset, batch, nbytes = item
+            written = upsert_sized(dev, table_name, key, batch, nbytes, sizer, metrics=m)
+            log(f"  {table_name}: synced batch {offset}-{offset + len(batch)} ({nbytes // 1024} KB)")
+            with progress:
+                synced += written
+                if not resumable:
+                    return
+                committed[seq] = keyset_position(batch[-1], key, column if since else None)
+                position = None
+                while next_checkpoint in committed:
+                    position = committed.pop(next_checkpoint)
+                    next_checkpoint += 1
+                if position is not None:
+                    journal.checkpoint(table_name, position)
+
+        pipelined(numbered(), upload, workers=upload_workers, depth=UPLOAD_QUEUE_DEPTH)
+        if not diff:
+            counts["upserted"] = synced
+
+        if column and watermark and synced == done:
+            state[table_name] = watermark
+
+        if prune:
+            missing = set(dev_digests) - seen
+            if missing:
+                with m.timed("delete"):
+                    counts["deleted"] = delete_rows(dev, table_name, key, missing)
+
+        if journal is not None:
+            journal.mark_done(table_name, state.get(table_name) if column else None)
+
+        if not total:
+            log(f"  No {'changes' if since else 'data'} in {table_name}.")
+        elif diff:
+            log(f"  {table_name}: found {total} rows; {counts['inserted']} inserted, "
+                f"{counts['updated']} updated, {counts['unchanged']} unchanged, "
+                f"{counts['deleted']} deleted; {sizer.summary()}.")
+        else:
+            log(f"  {table_name}: found {total} rows, synced {synced}; {sizer.summary()}.")
+
     except Exception as e:
-        print(f"Error syncing auth users: {e}")
+        m.add("errors")
+        log(f"Failed to sync table {table_name} after {total} rows: {e}")
+    return held
 
-def main():
-    print("Starting Data Sync...")
-    prod, dev = get_clients()
-
-    # 1. Tenants (Root dependency)
-    sync_table(prod, dev, "tenants")
-    
-    # 2. Neighborhoods
-    sync_table(prod, dev, "neighborhoods")
-
-    # 3. Lots
-    sync_table(prod, dev, "lots")
-    
-    # 4. Auth Users (Critical for public.users FK)
-    sync_auth_users(prod, dev)
-
-    # 5. Family Units (First pass - ignoring owner/contact if circular, or just upserting)
-    # If public.users FKs to family_units, we need family_units first.
-    # But family_units FKs to users (primary_contact_id).
-    # Strategy: Insert family_units, but maybe set primary_contact_id to NULL if it fails?
-    # Or rely on deferred? No.
-    # We will try to sync family_units. If primary_contact_id violates partial FK (because user not yet in public.users), 
-    # we might need to NULL it strictly.
-    # Actually, let's try syncing `family_units` but manually stripping `primary_contact_id`?
-    # Or:
-    # 1. Sync Users (with internal fks null?)
-    # 2. Sync Family Units
-    # 3. Update Users
-    # 4. Update Family Units
-    
-    # Let's try simple order first. If family_units depends on public.users for a non-nullable column, we are stuck.
-    # Checked schema: family_units.primary_contact_id is references public.users(id).
-    # public.users.family_unit_id references public.family_units(id).
-    # Both sets are nullable/updates?
-    # users.family_unit_id is nullable (ON DELETE SET NULL).
-    # family_units.primary_contact_id is nullable (ON DELETE SET NULL).
-    
-    # So:
-    # 1. Insert Family Units (set primary_contact_id = NULL temporarily/via code? or just hope they exist?)
-    #    User isn't in public.users yet. So primary_contact_id WILL fail if not null.
-    #    Let's handle this carefully.
-    
-    print("Syncing Family Units...")
+def null_deferred_columns(page, deferred_columns):
+    upload = []
+    pending = []
+    for row in page:
+        if any(row.get(c) is not None for c in deferred_columns):
+            pending.append(row)
+            row = dict(row)
+            for c in deferred_columns:
+                row[c] = None
+        upload.append(row)
+    return upload, pending
+
+def backfill_table(dev, table_name, rows, deferred_columns, schema, metrics=None):
+    # Second phase for cyclic tables: re-upsert the full prod rows held in
+    # memory, now that the rows their deferred columns point at exist.
+    # Full rows rather than (id, column) pairs, because the INSERT half of an
+    # upsert still has to satisfy the NOT NULL columns.
+    if not rows:
+        return
+    log(f"Back-filling {table_name} ({', '.join(deferred_columns)}) on {len(rows)} rows...")
+    synced = 0
+    sizer = BatchSizer()
+    lock = threading.Lock()
+    key = primary_key(schema, table_name)
+
+    def upload(item):
+        nonlocal synced
+        written = upsert_sized(dev, table_name, key, item[0], item[1], sizer, metrics=metrics, phase="backfill")
+        with lock:
+            synced += written
+
+    pipelined(sized_batches(rows, sizer), upload, workers=UPLOAD_WORKERS, depth=UPLOAD_QUEUE_DEPTH)
+    log(f"  {table_name}: back-filled {synced} of {len(rows)} rows; {sizer.summary()}.")
+
+def sync_table_pg(prod_db_url, dev_db_url, table_name, schema, state=None, deferred_columns=(),
+                  metrics=None, copy_format="binary", journal=None, profile=None):
+    # --backend pg: one COPY stream per table instead of paged REST upserts.
+    # Each job opens its own connections (psycopg connections are not shared
+    # between threads). Same delta watermarks and deferred-column handling
+    # as sync_table; the back-fill re-reads the deferred columns with COPY.
+    # A table is one transaction, so it is journaled as a whole.
+    column = delta_column(schema, table_name) if state is not None else None
+    since = state.get(table_name) if column else None
+    log(f"Syncing table: {table_name} ({f'delta since {since}' if since else 'full'}, COPY)...")
+    m = TableMetrics(table_name)
+    if metrics is not None:
+        metrics[table_name] = m
     try:
-        fu_resp = prod.table("family_units").select("*").execute()
-        fus = fu_resp.data
-        if fus:
-            # First pass: Insert without primary_contact_id
-            fus_clean = []
-            for fu in fus:
-                fu_copy = fu.copy()
-                fu_copy['primary_contact_id'] = None # Remove ref to avoid error
-                fus_clean.append(fu_copy)
-            
-            dev.table("family_units").upsert(fus_clean).execute()
-            print("  Synced Family Units (First Pass - No Contacts)")
+        with sync_pg.connect(prod_db_url) as src, sync_pg.connect(dev_db_url) as dst:
+            with m.timed("upsert"):
+                rows, nbytes, watermark = sync_pg.copy_table(
+                    src, dst, table_name, schema, deferred_columns=deferred_columns,
+                    since_column=column, since=since, copy_format=copy_format, profile=profile)
+        m.add("rows_fetched", rows)
+        m.add("rows_written", rows)
+        m.add("bytes_fetched", nbytes)
+        m.add("bytes_sent", nbytes)
+        m.add("requests")
+        m.counts["upserted"] = rows
+        if column and watermark:
+            state[table_name] = watermark
+        if journal is not None:
+            journal.mark_done(table_name, state.get(table_name) if column else None)
+        log(f"  {table_name}: copied {rows} rows ({nbytes // 1024} KB).")
     except Exception as e:
-        print(f"  Error in FU clean pass: {e}")
+        m.add("errors")
+        log(f"Failed to sync table {table_name}: {e}")
+
+def backfill_table_pg(prod_db_url, dev_db_url, table_name, schema, deferred_columns, since=None,
+                      metrics=None, copy_format="binary"):
+    column = delta_column(schema, table_name) if since else None
+    log(f"Back-filling {table_name} ({', '.join(deferred_columns)}) with COPY...")
+    with sync_pg.connect(prod_db_url) as src, sync_pg.connect(dev_db_url) as dst:
+        with metrics.timed("backfill") if metrics else nullcontext():
+            rows = sync_pg.backfill_columns(src, dst, table_name, schema, deferred_columns,
+                                            since_column=column, since=since, copy_format=copy_format)
+    log(f"  {table_name}: back-filled {rows} rows.")
+
+def list_auth_users(client, per_page=AUTH_PAGE_SIZE):
+    # GoTrue pages the admin listing; stop at the first empty page rather than
+    # a short one, since the server may cap per_page below what we ask for.
+    if isinstance(client, SnapshotReader):
+        return [SimpleNamespace(**row) for row in client.rows("auth.users")]
+    users = []
+    page = 1
+    while True:
+        batch = call(client, lambda: client.auth.admin.list_users(page=page, per_page=per_page))
+        if not batch:
+            return users
+        users.extend(batch)
+        page += 1
 
-    # 6. Public Users
-    sync_table(prod, dev, "users")
-    
-    # 7. Update Family Units (Restore primary_contact_id)
-    print("Updating Family Units Contacts...")
+def create_auth_user(dev, user):
+    call(dev, lambda: dev.auth.admin.create_user({
+        "id": user.id,
+        "email": user.email,
+        "password": DEFAULT_PASSWORD,
+        "email_confirm": True,
+        "user_metadata": user.user_metadata,
+    }))
+    log(f"  Created user {user.email} ({user.id})")
+
+def update_auth_user(dev, user):
+    call(dev, lambda: dev.auth.admin.update_user_by_id(user.id, {
+        "user_metadata": user.user_metadata,
+    }))
+    log(f"  Updated metadata for {user.email} ({user.id})")
+
+def sync_auth_users(prod, dev, update_metadata=False, workers=AUTH_WORKERS, user_ids=None):
+    # user_ids limits the sync to those accounts (tenant-scoped runs)
+    log("Syncing Auth Users...")
     try:
-        # Re-fetch or reuse
-        fu_resp = prod.table("family_units").select("*").execute()
-        fus = fu_resp.data
-        if fus:
-            # Only update those with contacts
-            for fu in fus:
-                if fu.get('primary_contact_id'):
-                    dev.table("family_units").update({'primary_contact_id': fu['primary_contact_id']}).eq('id', fu['id']).execute()
-            print("  Updated Family Units Contacts.")
+        prod_users = list_auth_users(prod)
+        if user_ids is not None:
+            prod_users = [user for user in prod_users if user.id in user_ids]
+        dev_users = {user.id: user for user in list_auth_users(dev)}
+        log(f"  {len(prod_users)} users in prod, {len(dev_users)} in dev.")
     except Exception as e:
-        print(f"  Error updating FU contacts: {e}")
-
-    print("Data Sync Complete.")
-
-    # 8. Core Resources (Locations must be before Events)
-    sync_table(prod, dev, "locations")
-    
-    # 9. Content / Features
-    sync_table(prod, dev, "announcements")
-    sync_table(prod, dev, "announcement_reads")
-    
-    sync_table(prod, dev, "event_categories")
-    sync_table(prod, dev, "events")
-    sync_table(prod, dev, "event_rsvps")
-    sync_table(prod, dev, "event_invites")
-    
-    sync_table(prod, dev, "check_ins")
-    sync_table(prod, dev, "check_in_rsvps")
-    
-    sync_table(prod, dev, "exchange_listings") # "Posts"
-    sync_table(prod, dev, "exchange_transactions")
-    
-    sync_table(prod, dev, "resident_requests")
-    sync_table(prod, dev, "notifications")
-    
-    # 10. User Meta
-    sync_table(prod, dev, "user_privacy_settings")
-    sync_table(prod, dev, "pets")
-    
-    print("Full Context Sync Complete.")
+        log(f"Error syncing auth users: {e}")
+        return
+
+    # Decide from the two listings instead of probing dev once per user
+    tasks = [(create_auth_user, user) for user in prod_users if user.id not in dev_users]
+    if update_metadata:
+        tasks += [
+            (update_auth_user, user) for user in prod_users
+            if user.id in dev_users and dev_users[user.id].user_metadata != user.user_metadata
+        ]
+    if not tasks:
+        log("  Auth users already in sync.")
+        return
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(task, dev, user): user for task, user in tasks}
+        for future in as_completed(futures):
+            if future.exception():
+                failed += 1
+                user = futures[future]
+                log(f"  Failed to sync user {user.email}: {future.exception()}")
+    log(f"  Auth users: {len(tasks) - failed} written, {failed} failed.")
+
+def take_snapshot(prod, directory, schema, workers=4):
+    # Extract every synced table (and the auth users needed to replay them)
+    # from prod into a local snapshot; nothing is written to dev.
+    log(f"Writing snapshot to {directory}...")
+    writer = SnapshotWriter(directory, source=PROD_URL)
+
+    def extract(table_name):
+        rows = writer.write_table(table_name, fetch_pages(prod, table_name, primary_key(schema, table_name)))
+        log(f"  {table_name}: {rows} rows")
+
+    def extract_auth_users():
+        users = list_auth_users(prod)
+        rows = writer.write_table("auth.users", [[
+            {"id": u.id, "email": u.email, "user_metadata": u.user_metadata} for u in users
+        ]])
+        log(f"  auth.users: {rows} users")
+
+    jobs = {name: partial(extract, name) for name in SYNC_TABLES}
+    jobs["auth.users"] = extract_auth_users
+    run_dag(jobs, {}, max_workers=workers, log=log)
+    writer.close()
+    log(f"Snapshot complete: {directory}")
+
+def find_tenant_id(client, slug, schema):
+    for page in fetch_pages(client, "tenants", primary_key(schema, "tenants"), filters=[("eq", "slug", slug)]):
+        return page[0]["id"]
+    return None
+
+def print_summary(metrics):
+    columns = ["inserted", "updated", "unchanged", "upserted", "deleted", "failed"]
+    columns = [c for c in columns if any(c in m.counts for m in metrics.values())]
+    width = max([len("table")] + [len(t) for t in metrics])
+    log("Sync summary:")
+    log("  " + "table".ljust(width) + "".join(c.rjust(11) for c in columns + ["seconds"]))
+    for table_name in [t for t in SYNC_TABLES if t in metrics]:
+        m = metrics[table_name]
+        cells = [str(m.counts.get(c, "-")) for c in columns] + [f"{sum(m.seconds.values()):.1f}"]
+        log("  " + table_name.ljust(width) + "".join(cell.rjust(11) for cell in cells))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sync production data into the dev project.")
+    parser.add_argument("--delta", action="store_true",
+                        help=f"Only copy rows changed since the last run (watermarks in {STATE_FILE})")
+    parser.add_argument("--update-auth-metadata", action="store_true",
+                        help="Also copy user_metadata onto auth users that already exist in dev")
+    parser.add_argument("--diff", action="store_true",
+                        help="Hash dev's rows first and only upsert rows that are new or changed")
+    parser.add_argument("--prune", action="store_true",
+                        help="With a full sync, also delete dev rows that no longer exist in prod (implies --diff)")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"Continue an interrupted run from its checkpoints in {JOURNAL_FILE}")
+    parser.add_argument("--replay-dead-letters", action="store_true",
+                        help=f"Only retry the rows recorded in {DEAD_LETTER_FILE}")
+    parser.add_argument("--tenant", metavar="SLUG",
+                        help="Only sync one tenant and the rows that hang off it through foreign keys")
+    parser.add_argument("--snapshot", metavar="DIR",
+                        help="Extract prod into a compressed on-disk snapshot instead of syncing dev")
+    parser.add_argument("--from-snapshot", metavar="DIR",
+                        help="Load dev from a snapshot written by --snapshot instead of reading prod")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="JSON column profiles: per table, columns to include/exclude or "
+                             "replace with placeholders (see scripts/sync_profiles.example.json)")
+    parser.add_argument("--report", metavar="PATH", default=REPORT_FILE,
+                        help=f"Where to write the JSON run report (default {REPORT_FILE})")
+    parser.add_argument("--prometheus", metavar="PATH",
+                        help="Also write per-table metrics in Prometheus text format")
+    parser.add_argument("--prod-rps", type=float, default=PROD_RPS,
+                        help=f"Request rate limit against prod (default {PROD_RPS}/s)")
+    parser.add_argument("--dev-rps", type=float, default=DEV_RPS,
+                        help=f"Request rate limit against dev (default {DEV_RPS}/s)")
+    parser.add_argument("--backend", choices=["rest", "pg"], default="rest",
+                        help="rest: PostgREST upserts (default); pg: COPY over direct Postgres "
+                             "connections (PROD_DATABASE_URL / DEV_DATABASE_URL)")
+    parser.add_argument("--copy-format", choices=["binary", "text"], default="binary",
+                        help="COPY format for --backend pg; use text if column types differ between projects")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Tables synced concurrently (1 = one table at a time)")
+    parser.add_argument("--upload-workers", type=int, default=UPLOAD_WORKERS,
+                        help=f"Concurrent upsert requests per table while it is fetched (default {UPLOAD_WORKERS})")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    log("Starting Data Sync...")
+    # Every table job may hold a prod request and upload-workers dev requests open at once
+    client_opts = {"prod_rps": args.prod_rps, "dev_rps": args.dev_rps,
+                   "pool_size": max(10, args.workers * (1 + args.upload_workers))}
+    pg = args.backend == "pg"
+    if pg:
+        if args.tenant or args.snapshot or args.from_snapshot or args.replay_dead_letters or args.diff or args.prune:
+            log("Error: --backend pg only supports full and --delta syncs")
+            exit(1)
+        if not (PROD_DB_URL and DEV_DB_URL):
+            log("Error: --backend pg needs PROD_DATABASE_URL and DEV_DATABASE_URL in .env.local")
+            exit(1)
+        # auth.users still goes through the admin API (it sets dev passwords),
+        # so REST clients are only needed when the service keys are present
+        prod, dev = get_clients(**client_opts) if PROD_KEY and DEV_KEY else (None, None)
+    elif args.snapshot:
+        prod, _ = get_clients(need_dev=False, **client_opts)
+        take_snapshot(prod, args.snapshot, load_schema(), workers=args.workers)
+        return
+    elif args.from_snapshot:
+        _, dev = get_clients(need_prod=False, **client_opts)
+        prod = SnapshotReader(args.from_snapshot)
+        log(f"Replaying snapshot {args.from_snapshot} ({prod.manifest['created_at']})")
+    else:
+        prod, dev = get_clients(**client_opts)
+    if args.replay_dead_letters:
+        replay_dead_letters(dev, load_schema())
+        return
+
+    schema = load_schema()
+    state = load_state(state_file(args.tenant)) if args.delta else None
+    start_state = dict(state or {})
+    metrics = {}
+    try:
+        profiles = load_profiles(args.profile, schema) if args.profile else {}
+    except ValueError as e:
+        log(f"Error: {e}")
+        exit(1)
+    for table_name, profile in sorted(profiles.items()):
+        skipped = len(schema[table_name]["columns"]) - len(profile["columns"])
+        log(f"  Profile for {table_name}: {skipped} of {len(schema[table_name]['columns'])} columns not copied.")
+
+    # Every job and committed batch is journaled; --resume skips what the
+    # interrupted run finished and picks its watermarks back up.
+    try:
+        journal = Journal(JOURNAL_FILE, vars(args), resume=args.resume)
+    except ValueError as e:
+        log(f"Error: {e}")
+        exit(1)
+    if args.resume and not journal.resumed:
+        log("Nothing to resume; starting a new run.")
+    if journal.resumed:
+        log(f"Resuming from {JOURNAL_FILE}: {len(journal.done)} jobs already done.")
+        if state is not None:
+            state.update({job: mark for job, mark in journal.done.items() if mark})
+    opts = {"schema": schema, "state": state, "metrics": metrics, "journal": journal}
+
+    # Foreign keys that close a cycle are loaded as NULL and back-filled by a
+    # separate "<table>:backfill" job once every table they point at is done.
+    deferred = deferred_foreign_keys(schema, SYNC_TABLES)
+    deferred_columns = {}
+    for table_name, column in sorted(deferred):
+        deferred_columns.setdefault(table_name, []).append(column)
+
+    dependencies = table_dependencies(schema, SYNC_TABLES, deferred=deferred)
+    for table_name, parents in EXTRA_DEPENDENCIES.items():
+        dependencies[table_name] |= parents
+
+    # --tenant: each table is filtered on tenant_id, or on the keys of the
+    # in-scope parent rows it references (bulk in.() filters), so only the
+    # FK closure of the tenant is copied.
+    tables = SYNC_TABLES
+    scopes = {}
+    scope_keys = {}
+    tenant_id = None
+    if args.tenant:
+        tenant_id = find_tenant_id(prod, args.tenant, schema)
+        if tenant_id is None:
+            log(f"Error: no tenant with slug {args.tenant}")
+            exit(1)
+        scopes = tenant_scopes(schema, SYNC_TABLES, deferred)
+        tables = [t for t in SYNC_TABLES if t in scopes]
+        for table_name in sorted(set(SYNC_TABLES) - set(tables)):
+            log(f"  {table_name} has no foreign-key path to tenants; skipped in tenant mode.")
+        log(f"Tenant mode: {args.tenant} ({tenant_id})")
+    key_parents = {parent for alternatives in scopes.values() for _, parent in alternatives if parent}
+
+    def table_scope(name):
+        if not args.tenant:
+            return None
+        return [[("eq", column, tenant_id)] if parent is None
+                else [("in", column, sorted(scope_keys.get(parent, ())))]
+                for column, parent in scopes[name]]
+
+    held = {}
+
+    def load(name):
+        if pg:
+            sync_table_pg(PROD_DB_URL, DEV_DB_URL, name, schema, state=state,
+                          deferred_columns=deferred_columns.get(name, ()), metrics=metrics,
+                          copy_format=args.copy_format, journal=journal, profile=profiles.get(name))
+            return
+        scope = table_scope(name)
+        held[name] = sync_table(prod, dev, name, deferred_columns=deferred_columns.get(name, ()),
+                                diff=args.diff, prune=args.prune, scope=scope,
+                                upload_workers=args.upload_workers, profile=profiles.get(name), **opts)
+        if name in key_parents:
+            scope_keys[name] = collect_keys(prod, name, primary_key(schema, name), scope)
+
+    def backfill(name):
+        if pg:
+            # The load job has already advanced state[name]; use the old mark
+            since = start_state.get(name)
+            backfill_table_pg(PROD_DB_URL, DEV_DB_URL, name, schema, deferred_columns[name], since=since,
+                              metrics=metrics.get(name), copy_format=args.copy_format)
+        else:
+            backfill_table(dev, name, held.get(name), deferred_columns[name], schema, metrics=metrics.get(name))
+        # A back-fill after a failed load had nothing to restore; leave it to the rerun
+        if journal.is_done(name):
+            journal.mark_done(f"{name}:backfill")
+
+    def skip(name):
+        log(f"Skipping {name}: finished before the interruption.")
+        if name in key_parents:
+            scope_keys[name] = collect_keys(prod, name, primary_key(schema, name), table_scope(name))
+
+    jobs = {name: partial(load, name) for name in tables}
+    for table_name, columns in deferred_columns.items():
+        if table_name not in tables:
+            continue
+        job = f"{table_name}:backfill"
+        jobs[job] = partial(backfill, table_name)
+        parents = {fk["references"] for fk in schema[table_name]["foreign_keys"]
+                   if set(fk["columns"]) & set(columns)}
+        dependencies[job] = {table_name} | (parents & set(SYNC_TABLES))
+    def sync_auth():
+        user_ids = None
+        if args.tenant:
+            user_ids = collect_keys(prod, "users", primary_key(schema, "users"), table_scope("users"))
+        sync_auth_users(prod, dev, update_metadata=args.update_auth_metadata, user_ids=user_ids)
+        journal.mark_done("auth.users")
+
+    # Without a job the run can still complete (and the journal close) when
+    # the admin API is out of reach
+    if prod is None:
+        log("Skipping auth users: no service role keys for the admin API.")
+    else:
+        jobs["auth.users"] = sync_auth
+        dependencies["auth.users"] = set()
+
+    # A cyclic table only counts as done once its back-fill is, since the
+    # rows held for the back-fill don't survive the interruption
+    for job in list(jobs):
+        finished = journal.is_done(job)
+        if job in deferred_columns:
+            finished = finished and journal.is_done(f"{job}:backfill")
+        if finished:
+            jobs[job] = partial(skip, job)
+
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    start = time.monotonic()
+    durations = run_dag(jobs, dependencies, max_workers=args.workers, log=log)
+    elapsed = time.monotonic() - start
+
+    if state is not None:
+        save_state(state, state_file(args.tenant))
+        log(f"Saved delta watermarks to {state_file(args.tenant)}")
+    if all(journal.is_done(job) for job in jobs):
+        journal.complete()
+    else:
+        log(f"Some jobs did not finish; rerun with --resume to continue from {JOURNAL_FILE}")
+
+    print_summary(metrics)
+    path, path_time = critical_path(dependencies, durations)
+    log(f"Critical path ({path_time:.1f}s): {' -> '.join(path)}")
+
+    run = {
+        "started_at": started_at,
+        "elapsed_seconds": round(elapsed, 3),
+        "source": args.from_snapshot or (PROD_DB_URL.rsplit("@", 1)[-1] if pg else PROD_URL),
+        "options": {k: v for k, v in vars(args).items() if k not in ("report", "prometheus")},
+        "jobs": {name: round(seconds, 3) for name, seconds in sorted(durations.items())},
+        "critical_path": {"jobs": path, "seconds": round(path_time, 3)},
+        "transport_retries": {
+            transport.name: transport.retries
+            for transport in (getattr(c, "sync_transport", None) for c in (prod, dev)) if transport
+        },
+    }
+    write_json_report(args.report, run, metrics)
+    log(f"Wrote run report to {args.report}")
+    if args.prometheus:
+        write_prometheus(args.prometheus, run, metrics)
+        log(f"Wrote Prometheus metrics to {args.prometheus}")
+    if os.path.exists(DEAD_LETTER_FILE):
+        log(f"Some rows failed; see {DEAD_LETTER_FILE} (retry with --replay-dead-letters)")
+    log(f"Full Context Sync Complete in {elapsed:.1f}s.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+import time
+
+# Options that change what a run copies; a run can only be resumed with the same ones
+RUN_OPTIONS = ["delta", "diff", "prune", "tenant", "from_snapshot", "backend", "profile"]
+
+class Journal:
+    # Append-only JSONL record of a sync run, fsynced per line:
+    #   {"event": "start", "options": {...}}
+    #   {"event": "checkpoint", "job": "events", "position": ...}  (after each committed batch)
+    #   {"event": "done", "job": "events", "watermark": ...}
+    #   {"event": "complete"}
+    # A --resume run replays it to skip finished jobs and continue a table
+    # from its last checkpoint. A run that reached "complete" is not resumable.
+
+    def __init__(self, path, options, resume=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = {}
+        self.positions = {}
+        self.resumed = False
+        options = {name: options.get(name) for name in RUN_OPTIONS}
+        if resume:
+            previous = self._replay()
+            if previous is not None and previous != options:
+                raise ValueError(f"{path} was written with different options "
+                                 f"({json.dumps(previous, sort_keys=True)}); rerun without --resume")
+            self.resumed = previous is not None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if self.resumed:
+            self.file = open(path, "a")
+        else:
+            self.done = {}
+            self.positions = {}
+            self.file = open(path, "w")
+            self._write({"event": "start", "options": options})
+
+    def _replay(self):
+        # Returns the options of an unfinished run, or None if there is none
+        try:
+            f = open(self.path, "r")
+        except FileNotFoundError:
+            return None
+        options = None
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn last line from the crash
+                event = entry["event"]
+                if event == "start":
+                    options = entry["options"]
+                    self.done = {}
+                    self.positions = {}
+                elif event == "checkpoint":
+                    self.positions[entry["job"]] = entry["position"]
+                elif event == "done":
+                    self.done[entry["job"]] = entry.get("watermark")
+                    self.positions.pop(entry["job"], None)
+                elif event == "complete":
+                    options = None
+        return options
+
+    def _write(self, entry):
+        entry["at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        with self.lock:
+            self.file.write(json.dumps(entry, default=str) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def is_done(self, job):
+        return job in self.done
+
+    def position(self, job):
+        return self.positions.get(job)
+
+    def checkpoint(self, job, position):
+        self._write({"event": "checkpoint", "job": job, "position": position})
+
+    def mark_done(self, job, watermark=None):
+        self.done[job] = watermark
+        self._write({"event": "done", "job": job, "watermark": watermark})
+
+    def complete(self):
+        self._write({"event": "complete"})
+        self.file.close()
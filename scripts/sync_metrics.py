@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PHASES = ["fetch", "transform", "upsert", "backfill", "delete"]
+
+class TableMetrics:
+    # Timings and counters for one table in a sync run. A table's upload
+    # workers record into it concurrently, so updates go through add() /
+    # add_seconds(), which hold the lock.
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.seconds = {phase: 0.0 for phase in PHASES}
+        self.counts = {
+            "rows_fetched": 0,
+            "rows_written": 0,
+            "bytes_fetched": 0,
+            "bytes_sent": 0,
+            "batches": 0,
+            "requests": 0,
+            "retries": 0,
+            "errors": 0,
+            "failed": 0,
+        }
+        self.batch_bytes = None
+        self.started = None
+        self.finished = None
+        self.lock = threading.Lock()
+
+    def add(self, name, value=1):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def add_seconds(self, phase, seconds):
+        with self.lock:
+            self.seconds[phase] += seconds
+            self.finished = time.monotonic()
+
+    @contextmanager
+    def timed(self, phase):
+        start = time.monotonic()
+        if self.started is None:
+            self.started = start
+        try:
+            yield
+        finally:
+            self.add_seconds(phase, time.monotonic() - start)
+
+    def to_dict(self):
+        wall = (self.finished - self.started) if self.started is not None else 0.0
+        busy = sum(self.seconds.values())
+        return {
+            "counts": dict(self.counts),
+            "seconds": {phase: round(s, 4) for phase, s in self.seconds.items()},
+            "wall_seconds": round(wall, 4),
+            "rows_per_second": round(self.counts["rows_fetched"] / busy, 1) if busy else None,
+            "final_batch_bytes": self.batch_bytes,
+        }
+
+def write_json_report(path, run, metrics):
+    # run: run-level fields (mode, timings, critical path); metrics: {table: TableMetrics}
+    report = dict(run)
+    report["tables"] = {name: m.to_dict() for name, m in sorted(metrics.items())}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def write_prometheus(path, run, metrics):
+    # Prometheus text exposition format, for node_exporter's textfile collector
+    lines = [
+        "# HELP sync_run_seconds Wall-clock time of the whole sync run.",
+        "# TYPE sync_run_seconds gauge",
+        f"sync_run_seconds {run['elapsed_seconds']:.4f}",
+        "# HELP sync_table_seconds Time spent per table and phase.",
+        "# TYPE sync_table_seconds gauge",
+    ]
+    for name, m in sorted(metrics.items()):
+        for phase, seconds in m.seconds.items():
+            lines.append(f'sync_table_seconds{{table="{name}",phase="{phase}"}} {seconds:.4f}')
+    # Per-run values that start from zero every run, so a gauge; a _total
+    # suffix would claim a monotonic counter
+    lines += [
+        "# HELP sync_table_count Row, byte, batch, request and failure counts per table in the last run.",
+        "# TYPE sync_table_count gauge",
+    ]
+    for name, m in sorted(metrics.items()):
+        for counter, value in sorted(m.counts.items()):
+            lines.append(f'sync_table_count{{table="{name}",counter="{counter}"}} {value}')
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(path + ".tmp", path)
@@ -0,0 +1,121 @@
+# psycopg 3 is only needed for --backend pg
+try:
+    import psycopg
+    from psycopg import sql
+    from psycopg.types.json import Jsonb
+except ImportError:
+    psycopg = None
+    sql = None
+    Jsonb = None
+
+from sync_schema import key_columns
+
+def connect(url):
+    if psycopg is None:
+        raise RuntimeError("--backend pg needs psycopg 3: pip install 'psycopg[binary]'")
+    return psycopg.connect(url)
+
+def _columns(names):
+    return sql.SQL(", ").join(sql.Identifier(name) for name in names)
+
+def _stream(src, dst, select, stage, columns, copy_format):
+    # COPY (select) TO STDOUT -> COPY stage FROM STDIN, chunk by chunk, so the
+    # table never sits in memory. Returns the number of bytes moved.
+    fmt = sql.SQL(copy_format)
+    nbytes = 0
+    with src.cursor() as rc, dst.cursor() as wc:
+        with rc.copy(sql.SQL("COPY ({}) TO STDOUT (FORMAT {})").format(select, fmt)) as out, \
+                wc.copy(sql.SQL("COPY {} ({}) FROM STDIN (FORMAT {})").format(
+                    sql.Identifier(stage), _columns(columns), fmt)) as inp:
+            for chunk in out:
+                inp.write(chunk)
+                nbytes += len(chunk)
+    return nbytes
+
+def copy_table(src, dst, table_name, schema, deferred_columns=(), since_column=None, since=None,
+               copy_format="binary", profile=None):
+    # Bulk copy of one public table between two Postgres connections:
+    #   1. COPY the source rows (deferred columns as NULL) into a temp stage
+    #   2. INSERT ... SELECT FROM stage ON CONFLICT (pk) DO UPDATE
+    # in a single transaction on dst. Binary COPY needs identical column types
+    # on both sides, which holds when both come from the same schema dump;
+    # pass copy_format="text" otherwise.
+    # A profile (sync_profiles) limits the copied columns; its placeholders
+    # are written as literals by the INSERT rather than copied.
+    # Returns (rows, bytes, watermark).
+    info = schema[table_name]
+    columns = list(profile["columns"] if profile else info["columns"])
+    placeholders = profile["placeholders"] if profile else {}
+    key = key_columns(schema, table_name)
+    stage = f"_sync_stage_{table_name}"
+
+    select_list = sql.SQL(", ").join(
+        sql.SQL("NULL") if name in deferred_columns else sql.Identifier(name) for name in columns
+    )
+    select = sql.SQL("SELECT {} FROM {}").format(select_list, sql.Identifier("public", table_name))
+    if since_column and since is not None:
+        select = sql.SQL("{} WHERE {} >= {}").format(select, sql.Identifier(since_column), sql.Literal(since))
+
+    watermark = since
+    with dst.transaction():
+        with dst.cursor() as wc:
+            wc.execute(sql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(
+                sql.Identifier(stage), sql.Identifier("public", table_name)))
+        nbytes = _stream(src, dst, select, stage, columns, copy_format)
+
+        targets = columns + list(placeholders)
+        values = [sql.Identifier(name) for name in columns] + [
+            sql.Literal(Jsonb(value) if isinstance(value, dict) else value) for value in placeholders.values()]
+        updates = [name for name in targets if name not in key]
+        if updates:
+            conflict = sql.SQL("DO UPDATE SET {}").format(sql.SQL(", ").join(
+                sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(name), sql.Identifier(name))
+                for name in updates))
+        else:
+            conflict = sql.SQL("DO NOTHING")
+        with dst.cursor() as wc:
+            wc.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {} ON CONFLICT ({}) {}").format(
+                sql.Identifier("public", table_name), _columns(targets), sql.SQL(", ").join(values),
+                sql.Identifier(stage), _columns(key), conflict))
+            rows = wc.rowcount
+            if since_column:
+                # to_json gives the same ISO format PostgREST returns, so the
+                # watermark in state.json works for either backend
+                wc.execute(sql.SQL("SELECT to_json(max({})) #>> '{{}}' FROM {}").format(
+                    sql.Identifier(since_column), sql.Identifier(stage)))
+                watermark = wc.fetchone()[0] or since
+    src.rollback()  # end the read transaction
+    return rows, nbytes, watermark
+
+def backfill_columns(src, dst, table_name, schema, deferred_columns, since_column=None, since=None,
+                     copy_format="binary"):
+    # Second phase for cyclic tables: copy only (pk, deferred columns) for rows
+    # where any of them is set, then UPDATE ... FROM the stage in one statement.
+    key = key_columns(schema, table_name)
+    columns = key + list(deferred_columns)
+    stage = f"_sync_backfill_{table_name}"
+
+    condition = sql.SQL(" OR ").join(
+        sql.SQL("{} IS NOT NULL").format(sql.Identifier(name)) for name in deferred_columns)
+    if since_column and since is not None:
+        condition = sql.SQL("({}) AND {} >= {}").format(condition, sql.Identifier(since_column), sql.Literal(since))
+    select = sql.SQL("SELECT {} FROM {} WHERE {}").format(
+        _columns(columns), sql.Identifier("public", table_name), condition)
+
+    with dst.transaction():
+        with dst.cursor() as wc:
+            wc.execute(sql.SQL("CREATE TEMP TABLE {} AS SELECT {} FROM {} WITH NO DATA").format(
+                sql.Identifier(stage), _columns(columns), sql.Identifier("public", table_name)))
+        _stream(src, dst, select, stage, columns, copy_format)
+        with dst.cursor() as wc:
+            wc.execute(sql.SQL("UPDATE {} AS t SET {} FROM {} AS s WHERE {}").format(
+                sql.Identifier("public", table_name),
+                sql.SQL(", ").join(sql.SQL("{} = s.{}").format(sql.Identifier(name), sql.Identifier(name))
+                                   for name in deferred_columns),
+                sql.Identifier(stage),
+                sql.SQL(" AND ").join(sql.SQL("t.{} = s.{}").format(sql.Identifier(name), sql.Identifier(name))
+                                      for name in key)))
+            rows = wc.rowcount
+            wc.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(stage)))
+    src.rollback()
+    return rows
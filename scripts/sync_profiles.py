@@ -0,0 +1,67 @@
+import json
+
+from sync_schema import key_columns
+
+# Per-table column profiles for the sync, from a JSON file like
+# sync_profiles.example.json:
+#   {"users": {"exclude": ["photos"], "placeholders": {"hero_photo": null}},
+#    "notifications": {"include": ["id", "tenant_id", "recipient_id", ...]}}
+# include / exclude pick the columns that are read from prod and written to
+# dev; placeholder columns are not read, and every written row sets them to
+# the given value. Columns that are neither keep whatever dev already has
+# (or their default, for new rows). digest_exclude lists the columns --diff
+# ignores when comparing rows, replacing the default ["updated_at"] (columns
+# dev's triggers rewrite on every update).
+
+PROFILE_KEYS = {"include", "exclude", "placeholders", "digest_exclude"}
+
+def load_profiles(path, schema):
+    # Returns {table: {"columns": [selected], "placeholders": {column: value},
+    #                  "digest_exclude": [column] or None}}
+    # and rejects profiles that would make inserts fail
+    with open(path, 'r') as f:
+        raw = json.load(f)
+    profiles = {}
+    for table_name, spec in raw.items():
+        if table_name not in schema:
+            raise ValueError(f"{path}: unknown table {table_name}")
+        columns = schema[table_name]["columns"]
+        key = key_columns(schema, table_name)
+        if set(spec) - PROFILE_KEYS:
+            raise ValueError(f"{path}: {table_name}: unknown keys {sorted(set(spec) - PROFILE_KEYS)}")
+        if "include" in spec and "exclude" in spec:
+            raise ValueError(f"{path}: {table_name}: use include or exclude, not both")
+        placeholders = spec.get("placeholders", {})
+        named = (set(spec.get("include", ())) | set(spec.get("exclude", ())) | set(placeholders)
+                 | set(spec.get("digest_exclude", ())))
+        if named - set(columns):
+            raise ValueError(f"{path}: {table_name}: unknown columns {sorted(named - set(columns))}")
+
+        if "include" in spec:
+            selected = [c for c in columns if c in spec["include"] or c in key]
+        else:
+            selected = [c for c in columns if c not in spec.get("exclude", ())]
+        selected = [c for c in selected if c not in placeholders]
+        if any(c not in selected for c in key):
+            raise ValueError(f"{path}: {table_name}: the primary key {key} must be synced")
+        required = [c for c in columns if c not in selected and c not in placeholders
+                    and columns[c]["not_null"] and not columns[c]["default"]]
+        if required:
+            raise ValueError(f"{path}: {table_name}: {', '.join(required)} is NOT NULL without a "
+                             f"default; include it or give it a placeholder")
+        profiles[table_name] = {"columns": selected, "placeholders": placeholders,
+                                "digest_exclude": spec.get("digest_exclude")}
+    return profiles
+
+def select_list(profile, extra=()):
+    # PostgREST select for a profile; extra columns (the delta column) are
+    # added so paging still works when the profile leaves them out
+    if profile is None:
+        return "*"
+    columns = profile["columns"] + [c for c in extra if c and c not in profile["columns"]]
+    return ",".join(columns)
+
+def apply_placeholders(rows, profile):
+    if profile is None or not profile["placeholders"]:
+        return rows
+    return [{**row, **profile["placeholders"]} for row in rows]
@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+def topological_order(dependencies):
+    # Kahn's algorithm; raises if the graph still has a cycle.
+    # Parents that are not jobs themselves are ignored.
+    remaining = {job: set(parents) & set(dependencies) for job, parents in dependencies.items()}
+    order = []
+    ready = sorted(job for job, parents in remaining.items() if not parents)
+    while ready:
+        job = ready.pop(0)
+        order.append(job)
+        for child, parents in remaining.items():
+            if job in parents:
+                parents.discard(job)
+                if not parents and child not in order and child not in ready:
+                    ready.append(child)
+    if len(order) != len(remaining):
+        stuck = sorted(set(remaining) - set(order))
+        raise ValueError(f"Dependency cycle between: {', '.join(stuck)}")
+    return order
+
+def critical_path(dependencies, durations):
+    # Longest chain of durations through the DAG (the lower bound on wall time)
+    finish = {}
+    previous = {}
+    for job in topological_order(dependencies):
+        start = 0.0
+        for parent in dependencies[job]:
+            if finish.get(parent, 0.0) > start:
+                start = finish[parent]
+                previous[job] = parent
+        finish[job] = start + durations.get(job, 0.0)
+    if not finish:
+        return [], 0.0
+    job = max(finish, key=finish.get)
+    total = finish[job]
+    path = [job]
+    while job in previous:
+        job = previous[job]
+        path.append(job)
+    return list(reversed(path)), total
+
+def run_dag(jobs, dependencies, max_workers=4, log=print):
+    # Runs each job (name -> callable) once all of its parents have finished.
+    # Independent jobs run concurrently on a bounded thread pool. A failing job
+    # is reported through log (pass a thread-safe one, like sync_data.log) but
+    # does not stop its dependents, matching the best-effort behaviour of the
+    # sequential sync. Returns {name: seconds}.
+    waiting = {job: set(dependencies.get(job, ())) & set(jobs) for job in jobs}
+    topological_order(waiting)  # fail fast on cycles
+    durations = {}
+    running = {}
+
+    def timed(name):
+        start = time.monotonic()
+        try:
+            jobs[name]()
+        finally:
+            durations[name] = time.monotonic() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while waiting or running:
+            for name in sorted(job for job, parents in waiting.items() if not parents):
+                del waiting[name]
+                running[pool.submit(timed, name)] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                if future.exception():
+                    log(f"  Job {name} failed: {future.exception()}")
+                for parents in waiting.values():
+                    parents.discard(name)
+
+    return durations
+
+def pipelined(items, fn, workers=2, depth=4):
+    # Producer/consumer: the calling thread pulls items (e.g. fetched,
+    # batched rows) and hands them to `workers` threads running fn through a
+    # queue of at most `depth` items. The producer blocks while the queue is
+    # full, so memory stays bounded while fetching overlaps with fn.
+    # The first exception from either side is re-raised once all threads stop.
+    tasks = queue.Queue(maxsize=depth)
+    errors = []
+
+    def consume():
+        while True:
+            item = tasks.get()
+            if item is None:
+                return
+            if errors:
+                continue  # drain so the producer never blocks forever
+            try:
+                fn(item)
+            except BaseException as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=consume, daemon=True) for _ in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+    try:
+        for item in items:
+            if errors:
+                break
+            tasks.put(item)
+    finally:
+        for _ in threads:
+            tasks.put(None)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
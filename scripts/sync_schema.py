@@ -0,0 +1,187 @@
+import re
+
+SCHEMA_FILE = "supabase/migrations/clean_schema_final.sql"
+
+TABLE_RE = re.compile(
+    r'^CREATE TABLE IF NOT EXISTS "(\w+)"\."(\w+)" \((.*?)^\);',
+    re.MULTILINE | re.DOTALL,
+)
+COLUMN_RE = re.compile(r'^\s+"(\w+)" (.*?),?$')
+PRIMARY_KEY_RE = re.compile(
+    r'^ALTER TABLE ONLY "(\w+)"\."(\w+)"\s+ADD CONSTRAINT "\w+" PRIMARY KEY \(([^)]*)\);',
+    re.MULTILINE,
+)
+FOREIGN_KEY_RE = re.compile(
+    r'^ALTER TABLE ONLY "(\w+)"\."(\w+)"\s+ADD CONSTRAINT "(\w+)" FOREIGN KEY \(([^)]*)\) '
+    r'REFERENCES "(\w+)"\."(\w+)"\(([^)]*)\)',
+    re.MULTILINE,
+)
+
+def split_columns(column_list):
+    return [c.strip().strip('"') for c in column_list.split(",")]
+
+def load_schema(path=SCHEMA_FILE):
+    # Reads the pg_dump schema and returns, per public table:
+    #   {"columns": {name: {"not_null": bool, "default": bool}}, "primary_key": [cols],
+    #    "foreign_keys": [{"name", "columns", "references", "ref_columns"}]}
+    # References to other schemas keep their prefix ("auth.users").
+    with open(path, 'r') as f:
+        content = f.read()
+
+    tables = {}
+    for match in TABLE_RE.finditer(content):
+        schema_name, table_name, body = match.groups()
+        if schema_name != "public":
+            continue
+        columns = {}
+        for line in body.splitlines():
+            col = COLUMN_RE.match(line)
+            if not col:
+                continue
+            definition = col.group(2)
+            columns[col.group(1)] = {"not_null": "NOT NULL" in definition, "default": "DEFAULT" in definition}
+        tables[table_name] = {"columns": columns, "primary_key": [], "foreign_keys": []}
+
+    for match in PRIMARY_KEY_RE.finditer(content):
+        schema_name, table_name, key = match.groups()
+        if schema_name == "public" and table_name in tables:
+            tables[table_name]["primary_key"] = split_columns(key)
+
+    for match in FOREIGN_KEY_RE.finditer(content):
+        schema_name, table_name, name, columns, ref_schema, ref_table, ref_columns = match.groups()
+        if schema_name != "public" or table_name not in tables:
+            continue
+        tables[table_name]["foreign_keys"].append({
+            "name": name,
+            "columns": split_columns(columns),
+            "references": ref_table if ref_schema == "public" else f"{ref_schema}.{ref_table}",
+            "ref_columns": split_columns(ref_columns),
+        })
+
+    return tables
+
+def key_columns(schema, table_name):
+    # Primary key columns of a table; "id" when the dump declares none
+    return schema.get(table_name, {}).get("primary_key") or ["id"]
+
+def primary_key(schema, table_name):
+    # The single column the REST sync pages, diffs, dedups and deletes by
+    key = key_columns(schema, table_name)
+    if len(key) > 1:
+        raise ValueError(f"{table_name}: composite primary key ({', '.join(key)}) can't be paged by one column")
+    return key[0]
+
+def table_dependencies(schema, tables, deferred=()):
+    # Parent tables each table has to wait for, restricted to `tables`.
+    # Self references and the (table, column) pairs in `deferred` are ignored.
+    dependencies = {}
+    for table_name in tables:
+        parents = set()
+        for fk in schema.get(table_name, {}).get("foreign_keys", []):
+            if any((table_name, column) in deferred for column in fk["columns"]):
+                continue
+            parent = fk["references"]
+            if parent != table_name and parent in tables:
+                parents.add(parent)
+        dependencies[table_name] = parents
+    return dependencies
+
+def deferred_foreign_keys(schema, tables):
+    # Foreign keys that close a cycle between `tables` (including self
+    # references), as (table, column) pairs. Loading these columns as NULL and
+    # back-filling them afterwards leaves a DAG that can be synced in order.
+    #
+    # Tables are ordered with the Eades-Lin-Smyth feedback-arc heuristic: peel
+    # off sinks and sources, otherwise take the table with the largest
+    # out-minus-in weight. Arcs pointing backwards in that order are deferred.
+    # NOT NULL columns weigh far more so they are kept as ordering constraints.
+    weights = {}
+    arcs = []
+    for table_name in tables:
+        columns = schema.get(table_name, {}).get("columns", {})
+        for fk in schema.get(table_name, {}).get("foreign_keys", []):
+            parent = fk["references"]
+            if parent not in tables:
+                continue
+            not_null = any(columns.get(c, {}).get("not_null") for c in fk["columns"])
+            arcs.append((parent, table_name, fk["columns"], not_null))
+            if parent != table_name:
+                key = (parent, table_name)
+                weights[key] = weights.get(key, 0) + (1000 if not_null else 1)
+
+    remaining = set(tables)
+    head, tail = [], []
+
+    def degree(table_name, outgoing):
+        return sum(
+            w for (parent, child), w in weights.items()
+            if (parent if outgoing else child) == table_name
+            and (child if outgoing else parent) in remaining
+        )
+
+    while remaining:
+        peeled = True
+        while peeled:
+            peeled = False
+            for table_name in sorted(remaining):
+                if not degree(table_name, outgoing=True):
+                    tail.insert(0, table_name)
+                elif not degree(table_name, outgoing=False):
+                    head.append(table_name)
+                else:
+                    continue
+                remaining.discard(table_name)
+                peeled = True
+        if remaining:
+            table_name = max(sorted(remaining), key=lambda t: degree(t, True) - degree(t, False))
+            head.append(table_name)
+            remaining.discard(table_name)
+
+    position = {table_name: i for i, table_name in enumerate(head + tail)}
+    deferred = set()
+    for parent, child, columns, not_null in arcs:
+        if position[parent] < position[child]:
+            continue
+        if not_null and parent == child:
+            continue  # rows arrive in key order; nothing to null out
+        if not_null:
+            raise ValueError(
+                f"Cannot break the cycle at NOT NULL {child}.{', '.join(columns)} -> {parent}"
+            )
+        deferred.update((child, column) for column in columns)
+    return deferred
+
+def tenant_scopes(schema, tables, deferred=()):
+    # How to restrict each table to one tenant's rows, as a list of
+    # alternatives (a row is in scope if any of them matches):
+    #   [("tenant_id", None)]          rows with tenant_id = <tenant>
+    #   [(column, parent), ...]        rows whose column is the primary key of an in-scope parent row
+    # A NOT NULL foreign key to an in-scope parent is enough on its own;
+    # otherwise every nullable one is an alternative. Tables with no path to
+    # the tenant are left out.
+    scopes = {"tenants": [("id", None)]} if "tenants" in tables else {}
+    changed = True
+    while changed:
+        changed = False
+        for table_name in tables:
+            if table_name in scopes:
+                continue
+            info = schema.get(table_name, {})
+            columns = info.get("columns", {})
+            if "tenant_id" in columns:
+                scopes[table_name] = [("tenant_id", None)]
+                changed = True
+                continue
+            required = []
+            optional = []
+            for fk in info.get("foreign_keys", []):
+                parent = fk["references"]
+                column = fk["columns"][0]
+                if (len(fk["columns"]) != 1 or parent not in scopes or (table_name, column) in deferred
+                        or fk["ref_columns"] != schema[parent]["primary_key"]):
+                    continue
+                (required if columns.get(column, {}).get("not_null") else optional).append((column, parent))
+            if required or optional:
+                scopes[table_name] = required[:1] or optional
+                changed = True
+    return scopes
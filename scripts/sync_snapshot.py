@@ -0,0 +1,116 @@
+import gzip
+import io
+import json
+import os
+import time
+
+# zstd is optional; snapshots fall back to gzip when it isn't installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MANIFEST = "manifest.json"
+CHUNK_ROWS = 50000
+
+def open_chunk(path, mode):
+    # mode is "w" or "r"; text NDJSON over a zstd or gzip stream
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed; pip install zstandard to read it")
+        f = open(path, mode + "b")
+        if mode == "w":
+            stream = zstandard.ZstdCompressor(level=3).stream_writer(f)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(f)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return gzip.open(path, mode + "t", encoding="utf-8")
+
+class SnapshotWriter:
+    # Writes each table as numbered NDJSON chunks plus a manifest:
+    #   <dir>/manifest.json
+    #   <dir>/<table>/000000.ndjson.zst (or .gz)
+
+    def __init__(self, directory, source=None, compression=None, chunk_rows=CHUNK_ROWS):
+        self.directory = directory
+        self.compression = compression or ("zst" if zstandard else "gz")
+        self.chunk_rows = chunk_rows
+        self.manifest = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "source": source,
+            "compression": self.compression,
+            "tables": {},
+        }
+        os.makedirs(directory, exist_ok=True)
+
+    def write_table(self, table_name, pages):
+        table_dir = os.path.join(self.directory, table_name)
+        os.makedirs(table_dir, exist_ok=True)
+        chunks = []
+        rows = 0
+        out = None
+        for page in pages:
+            for row in page:
+                if out is None or chunks[-1]["rows"] >= self.chunk_rows:
+                    if out is not None:
+                        out.close()
+                    name = f"{len(chunks):06d}.ndjson.{self.compression}"
+                    out = open_chunk(os.path.join(table_dir, name), "w")
+                    chunks.append({"file": f"{table_name}/{name}", "rows": 0})
+                out.write(json.dumps(row, default=str) + "\n")
+                chunks[-1]["rows"] += 1
+                rows += 1
+        if out is not None:
+            out.close()
+        for chunk in chunks:
+            chunk["bytes"] = os.path.getsize(os.path.join(self.directory, chunk["file"]))
+        self.manifest["tables"][table_name] = {"rows": rows, "chunks": chunks}
+        return rows
+
+    def close(self):
+        # The manifest is written last: a snapshot without one is incomplete
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+class SnapshotReader:
+    # Streams a snapshot back chunk by chunk; use it wherever the sync reads
+    # from prod (fetch_pages / list_auth_users accept it as the client).
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST), "r") as f:
+            self.manifest = json.load(f)
+
+    def tables(self):
+        return list(self.manifest["tables"])
+
+    def rows(self, table_name):
+        entry = self.manifest["tables"].get(table_name)
+        if entry is None:
+            return
+        for chunk in entry["chunks"]:
+            with open_chunk(os.path.join(self.directory, chunk["file"]), "r") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def pages(self, table_name, page_size=1000, since_column=None, since=None, filters=(), columns="*"):
+        # Same filtering as the REST fetch: since is >=, filters are eq/in
+        # tuples, columns is a select list
+        filters = [(op, column, set(value) if op == "in" else value) for op, column, value in filters]
+        names = None if columns == "*" else columns.split(",")
+        page = []
+        for row in self.rows(table_name):
+            if since is not None and (row.get(since_column) or "") < since:
+                continue
+            if not all(row.get(column) in value if op == "in" else row.get(column) == value
+                       for op, column, value in filters):
+                continue
+            page.append(row if names is None else {name: row.get(name) for name in names})
+            if len(page) >= page_size:
+                yield page
+                page = []
+        if page:
+            yield page
@@ -0,0 +1,136 @@
+import random
+import threading
+import time
+
+# httpx ships with supabase-py; pool tuning is skipped if it isn't importable
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Statuses worth retrying: rate limited, or the gateway/database hiccupped
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# PostgREST's APIError carries a PGRST or SQLSTATE code rather than a status.
+# Transient ones: PostgREST can't reach or lost the database (PGRST000-003),
+# statement timeout (57014), serialization failure (40001), deadlock (40P01),
+# too many connections (53300), server shutting down (57P01)
+RETRYABLE_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003",
+                   "57014", "40001", "40P01", "53300", "57P01"}
+
+class TokenBucket:
+    # Thread-safe token bucket: `rate` requests per second on average, with
+    # bursts of up to `burst`. acquire() blocks until a token is available.
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        # Takes a token and returns how long the caller must wait for it
+        with self.lock:
+            self._refill()
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+def error_code(exc):
+    return str(getattr(exc, "code", "") or "")
+
+def error_status(exc):
+    # HTTP status of a failed call, whichever client raised it. A numeric
+    # code only counts when it is status-shaped: SQLSTATEs are five digits.
+    response = getattr(exc, "response", None)
+    status = (getattr(response, "status_code", None) or getattr(exc, "status_code", None)
+              or getattr(exc, "status", None))
+    if not isinstance(status, int):
+        status = None
+    if status is None:
+        code = error_code(exc)
+        status = int(code) if code.isdigit() and len(code) == 3 else None
+    return status
+
+def retry_after(exc):
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(exc):
+    if httpx is not None and isinstance(exc, (httpx.TransportError, httpx.TimeoutException)):
+        return True
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    return error_status(exc) in RETRYABLE_STATUS or error_code(exc) in RETRYABLE_CODES
+
+class Transport:
+    # Shared policy for all traffic to one target (prod or dev): a token
+    # bucket rate limit plus exponential backoff with full jitter for
+    # transient failures. Non-retryable errors (constraint violations, bad
+    # requests) are raised at once so the caller can bisect or dead-letter.
+
+    def __init__(self, name, rate=20, burst=None, attempts=5, base_delay=0.5, max_delay=30.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    def backoff(self, attempt, exc):
+        delay = retry_after(exc)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return delay
+
+    def call(self, fn):
+        for attempt in range(self.attempts):
+            self.bucket.acquire()
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == self.attempts - 1 or not is_retryable(e):
+                    raise
+                self.retries += 1
+                time.sleep(self.backoff(attempt, e))
+
+    def execute(self, query):
+        return self.call(query.execute)
+
+def uses_http2(session):
+    # httpx keeps the flag on the transport's connection pool only
+    pool = getattr(getattr(session, "_transport", None), "_pool", None)
+    return bool(getattr(pool, "_http2", False))
+
+def pooled_session(session, max_connections, timeout=60.0):
+    # Replacement for a postgrest httpx session: same base URL, auth headers,
+    # HTTP/2 and redirect settings, but with a keep-alive pool sized for the
+    # sync's concurrency
+    limits = httpx.Limits(max_connections=max_connections,
+                          max_keepalive_connections=max_connections,
+                          keepalive_expiry=30.0)
+    return httpx.Client(base_url=session.base_url, headers=session.headers, timeout=timeout, limits=limits,
+                        http2=uses_http2(session), follow_redirects=session.follow_redirects)
+
+def configure_pool(client, max_connections):
+    # Swap the client's PostgREST session for a pooled one. Safe to skip:
+    # without httpx (or with an unexpected client) the default session stays.
+    if httpx is None or not hasattr(client, "postgrest"):
+        return
+    postgrest = client.postgrest
+    old = postgrest.session
+    postgrest.session = pooled_session(old, max_connections)
+    old.close()